@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# Measures bytes on the wire and decode time of realistic historical and realtime payloads, for each
+# content encoding and each JSON decoder available here. Results go to the same file as run_benchmarks.py.
+import os
+import sys
+import gzip
+import json
+import time
+import zlib
+import argparse
+import statistics
+from datetime import datetime
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+from mock_fastly import bucket_value
+from run_benchmarks import RESULTS_FILE, current_commit, load_previous_run, print_report
+from fastly_common.fields import DEFAULT_STATS_FIELDS
+from fastly_common.jsoncodec import FAST_DECODERS, load_decoder
+
+POPS = ["AMS", "ATL", "BOS", "CDG", "DFW", "FRA", "HKG", "IAD", "LAX", "LHR", "MAD", "NRT", "ORD", "SEA", "SIN", "SJC", "SYD", "YYZ"]
+
+def historical_payload(buckets, by_seconds=60):
+    start = 1700000000 // by_seconds * by_seconds
+    data = []
+    for i in range(buckets):
+        start_time = start + i * by_seconds
+        bucket = {'service_id': "SU1Z0isxPaozGVKXdv0eY", 'start_time': start_time}
+        for field in DEFAULT_STATS_FIELDS:
+            bucket[field] = bucket_value("svc", start_time, field)
+        data.append(bucket)
+    return {'data': data, 'meta': {'from': str(start), 'to': str(start + buckets * by_seconds), 'by': "minute", 'region': "all"}, 'msg': None, 'status': "success"}
+
+def realtime_stats(recorded, seed):
+    stats = {field: bucket_value(seed, recorded, field) for field in DEFAULT_STATS_FIELDS}
+    stats['miss_histogram'] = {str(edge): bucket_value(seed, recorded, edge) % 50 for edge in range(10, 1000, 10)}
+    return stats
+
+def realtime_payload(samples):
+    now = 1700000000
+    data = []
+    for recorded in range(now - samples, now):
+        data.append({
+            'recorded': recorded,
+            'aggregated': realtime_stats(recorded, "all"),
+            'datacenter': {pop: realtime_stats(recorded, pop) for pop in POPS},
+        })
+    return {'Data': data, 'Timestamp': now, 'AggregateDelay': 5}
+
+def time_call(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {'runs': repeat, 'min_ms': round(min(timings) * 1000, 3), 'median_ms': round(statistics.median(timings) * 1000, 3), 'max_ms': round(max(timings) * 1000, 3)}
+
+def encodings():
+    available = {
+        'identity': (lambda body: body, lambda body: body),
+        'gzip': (lambda body: gzip.compress(body, compresslevel=6), gzip.decompress),
+        'deflate': (zlib.compress, zlib.decompress),
+    }
+    try:
+        import brotli
+        available['br'] = (brotli.compress, brotli.decompress)
+    except ImportError:
+        pass
+    return available
+
+def decoders():
+    available = {}
+    for name in ("json",) + FAST_DECODERS:
+        try:
+            available[name] = load_decoder(name)[1]
+        except ImportError:
+            pass
+    return available
+
+def bench_payload(label, payload, repeat):
+    results = {}
+    body = json.dumps(payload).encode()
+    for encoding, (compress, decompress) in encodings().items():
+        wire = compress(body)
+        results[f"{label}_{encoding}_bytes"] = {'bytes': len(wire)}
+        if encoding != 'identity':
+            results[f"{label}_{encoding}_inflate"] = time_call(lambda: decompress(wire), repeat)
+    for name, loads in decoders().items():
+        results[f"{label}_decode_{name}"] = time_call(lambda: loads(body), repeat)
+    return results
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark payload size per content encoding and decode time per JSON decoder")
+    parser.add_argument("--buckets", type=int, default=1440, help="buckets in the historical payload (a day by minute)")
+    parser.add_argument("--samples", type=int, default=1, help="seconds of samples in the realtime payload")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--results", default=RESULTS_FILE)
+    parser.add_argument("--label", default=None)
+    return parser.parse_args(argv)
+
+def run(args):
+    results = {}
+    results.update(bench_payload("historical", historical_payload(args.buckets), args.repeat))
+    results.update(bench_payload("realtime", realtime_payload(args.samples), args.repeat))
+
+    run_config = {'suite': "payloads", 'buckets': args.buckets, 'samples': args.samples, 'repeat': args.repeat}
+    results_file = os.path.abspath(args.results)
+    previous = load_previous_run(results_file, run_config)
+    record = {
+        'timestamp': datetime.utcnow().isoformat() + "Z",
+        'commit': current_commit(),
+        'label': args.label,
+        'config': run_config,
+        'results': results,
+    }
+    with open(results_file, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    print_report(results, previous)
+    print(f"\nResults appended to {results_file}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args(sys.argv[1:])))
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# Local stand-in for the parts of api.fastly.com and rt.fastly.com the query scripts use.
+# Point the scripts at it with FASTLY_API_BASE_URL / FASTLY_RT_BASE_URL.
+import sys
+import gzip
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+BUCKET_SECONDS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+ENVIRONMENT_PREFIXES = ["", "dev-", "qa-"]
+STATS_FIELDS = ["requests", "hits", "miss", "pass", "errors", "status_5xx", "status_4xx", "status_2xx", "all_pass_requests", "bandwidth"]
+REALTIME_SAMPLES_PER_RESPONSE = 1  # Seconds of samples returned to a poll without a cursor
+
+class MockConfig:
+    def __init__(self, services=500, extra_fields=0, latency_ms=0.0, error_rate=0.0, seed=0, compress=True):
+        self.services = services
+        self.extra_fields = extra_fields  # Padding fields per bucket to grow the payload size
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.seed = seed
+        self.compress = compress
+
+def service_catalog(config):
+    services = []
+    for i in range(config.services):
+        prefix = ENVIRONMENT_PREFIXES[i % len(ENVIRONMENT_PREFIXES)]
+        services.append({'name': f"{prefix}service-{i:05d}", 'id': f"svc{i:05d}"})
+    return services
+
+def bucket_value(service_id, start_time, field):
+    # Deterministic per bucket, so repeated queries return the same numbers
+    digest = hashlib.md5(f"{service_id}:{start_time}:{field}".encode()).digest()
+    return int.from_bytes(digest[:3], "big") % 10000
+
+def stats_bucket(config, service_id, start_time, fields, full_row=True):
+    bucket = {'service_id': service_id, 'start_time': start_time}
+    for field in fields:
+        bucket[field] = bucket_value(service_id, start_time, field)
+    if full_row:
+        for i in range(config.extra_fields):
+            bucket[f"extra_field_{i}"] = i
+    return bucket
+
+def realtime_sample(config, service_id, recorded):
+    aggregated = {field: bucket_value(service_id, recorded, field) for field in STATS_FIELDS}
+    aggregated['miss_histogram'] = {str(edge): bucket_value(service_id, recorded, edge) % 50 for edge in range(10, 500, 10)}
+    for i in range(config.extra_fields):
+        aggregated[f"extra_field_{i}"] = i
+    return {'recorded': recorded, 'aggregated': aggregated, 'datacenter': {}}
+
+class MockFastlyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Headers and body go out in separate writes; Nagle would add ~40ms per keep-alive response
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        # Compressed like the real API whenever the client offers gzip
+        compress = self.server.config.compress and "gzip" in self.headers.get("Accept-Encoding", "")
+        if compress:
+            body = gzip.compress(body, compresslevel=6)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if compress:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count_bytes(len(body))
+
+    def do_GET(self):
+        config = self.server.config
+        self.server.count_request()
+        if config.latency_ms:
+            time.sleep(config.latency_ms / 1000)
+        if config.error_rate and self.server.random() < config.error_rate:
+            self.send_json(503, {'msg': "Injected error"})
+            return
+
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = url.path.strip("/").split("/")
+        if parts == ["service"]:
+            self.send_json(200, self.services_page(query))
+        elif len(parts) == 3 and parts[:2] == ["stats", "service"]:
+            self.send_json(200, self.stats(parts[2], query, STATS_FIELDS, full_row=True))
+        elif len(parts) == 5 and parts[:2] == ["stats", "service"] and parts[3] == "field":
+            self.send_json(200, self.stats(parts[2], query, [parts[4]], full_row=False))
+        elif len(parts) == 5 and parts[0] == "v1" and parts[1] == "channel" and parts[3] == "ts":
+            self.send_json(200, self.realtime(parts[2], int(parts[4])))
+        else:
+            self.send_json(404, {'msg': "Record not found"})
+
+    def services_page(self, query):
+        page = int(query.get('page', 1))
+        per_page = int(query.get('per_page', 20))
+        return self.server.catalog[(page - 1) * per_page:page * per_page]
+
+    def stats(self, service_id, query, fields, full_row):
+        step = BUCKET_SECONDS.get(query.get('by', 'minute'), 60)
+        start = int(query.get('from', 0)) // step * step
+        end = int(query.get('to', start))
+        data = [stats_bucket(self.server.config, service_id, start_time, fields, full_row) for start_time in range(start, end, step)]
+        return {'data': data, 'status': "success", 'meta': {'from': query.get('from'), 'to': query.get('to'), 'by': query.get('by')}}
+
+    def realtime(self, service_id, timestamp):
+        now = int(time.time())
+        # Like rt.fastly.com, a response carries the samples recorded since the cursor, and at least the latest one
+        first = min(max(timestamp, now - REALTIME_SAMPLES_PER_RESPONSE), now)
+        samples = [realtime_sample(self.server.config, service_id, recorded) for recorded in range(first, now + 1)]
+        return {'Data': samples, 'Timestamp': now}
+
+class MockFastlyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config, address=("127.0.0.1", 0)):
+        super().__init__(address, MockFastlyHandler)
+        self.config = config
+        self.catalog = service_catalog(config)
+        self.requests = 0
+        self.bytes_sent = 0  # Response bodies as sent on the wire, after any compression
+        self._lock = threading.Lock()
+        self._random = random.Random(config.seed)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def count_bytes(self, size):
+        with self._lock:
+            self.bytes_sent += size
+
+    def random(self):
+        with self._lock:
+            return self._random.random()
+
+def start_mock_server(config):
+    server = MockFastlyServer(config)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Serve a mock Fastly API for benchmarking")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--services", type=int, default=500)
+    parser.add_argument("--extra-fields", type=int, default=0, help="padding fields per bucket, to grow payloads")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 503")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-compress", dest="compress", action="store_false", help="never gzip responses")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args(sys.argv[1:])
+    config = MockConfig(args.services, args.extra_fields, args.latency_ms, args.error_rate, args.seed, args.compress)
+    server = MockFastlyServer(config, ("127.0.0.1", args.port))
+    print(f"Mock Fastly API listening on {server.base_url}")
+    print(f"  export FASTLY_API_BASE_URL={server.base_url} FASTLY_RT_BASE_URL={server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# Benchmarks query_fastly.py against the local mock API and appends the results to a JSON lines file,
+# printing the change against the previous run made with the same mock configuration.
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import statistics
+from datetime import datetime
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, SCRIPTS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+from mock_fastly import MockConfig, start_mock_server
+
+RESULTS_FILE = os.path.join(BENCHMARKS_DIR, "benchmark_results.jsonl")
+RESOLUTION_QUERY = ("service-00043", "dev")  # dev-service-00043 exists in the mock catalog, so this takes the exact-match path
+HISTORICAL_FIELD = "status_5xx"  # Single-stat queries go to the per-field endpoint
+HISTORICAL_RANGES = [
+    ("1h_by_minute", 3600, 'minute'),
+    ("1d_by_minute", 86400, 'minute'),
+    ("7d_by_hour", 7 * 86400, 'hour'),
+    ("90d_by_day", 90 * 86400, 'day'),
+]
+
+def load_query_fastly(base_url, workdir):
+    # The scripts read their endpoints, token and store location at import time
+    os.environ["FASTLY_API_BASE_URL"] = base_url
+    os.environ["FASTLY_RT_BASE_URL"] = base_url
+    os.environ["FASTLY_API_TOKEN"] = "benchmark"
+    os.environ["FASTLY_STATS_DB"] = os.path.join(workdir, "fastly_stats.db")
+    os.chdir(workdir)
+    import query_fastly
+    return query_fastly
+
+def summarize_timings(timings):
+    return {
+        'runs': len(timings),
+        'min_ms': round(min(timings) * 1000, 3),
+        'median_ms': round(statistics.median(timings) * 1000, 3),
+        'max_ms': round(max(timings) * 1000, 3),
+    }
+
+def reset_process_state(q):
+    # Drops what a long-lived process keeps in memory, leaving the on-disk caches in place
+    from fastly_common import cache
+    q.service_index = None
+    q.resolution_cache = None
+    cache._memory_cache.clear()
+
+def remove_disk_caches(q):
+    for cache_file in (q.CACHE_FILE, q.SERVICES_INDEX_FILE, q.RESOLUTION_CACHE_FILE):
+        for path in (cache_file, f"{cache_file}.lock"):
+            if os.path.exists(path):
+                os.remove(path)
+
+def resolve_once(q):
+    service_name, environment = RESOLUTION_QUERY
+    return q.resolve_service(service_name, environment, q.list_services())
+
+def bench_name_resolution(q, repeat):
+    cold = []
+    warm = []
+    for _ in range(repeat):
+        remove_disk_caches(q)
+        reset_process_state(q)
+        start = time.perf_counter()
+        resolve_once(q)
+        cold.append(time.perf_counter() - start)
+
+        reset_process_state(q)
+        start = time.perf_counter()
+        resolve_once(q)
+        warm.append(time.perf_counter() - start)
+    return {'resolution_cold': summarize_timings(cold), 'resolution_warm': summarize_timings(warm)}
+
+def historical_query(q, service_id, seconds, by):
+    end_time = int(time.time()) // 60 * 60
+    result = q.get_historical_data(q.API_TOKEN, service_id, end_time - seconds, end_time, by, q.COMMON_FIELDS)
+    return result[0].results() if result else None
+
+def historical_field_query(q, service_id, seconds, by):
+    # Single-stat queries stream their field straight into aggregation, as main does
+    end_time = int(time.time()) // 60 * 60
+    return q.get_historical_aggregates(q.API_TOKEN, service_id, end_time - seconds, end_time, by, [HISTORICAL_FIELD])
+
+def bench_historical(q, repeat):
+    results = {}
+    for label, seconds, by in HISTORICAL_RANGES:
+        cold = []
+        warm = []
+        field = []
+        for run in range(repeat):
+            # A service id the local store has never seen makes every cold run fetch the full range
+            service_id = f"bench-{label}-{os.getpid()}-{time.time_ns()}-{run}"
+            start = time.perf_counter()
+            historical_query(q, service_id, seconds, by)
+            cold.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            historical_query(q, service_id, seconds, by)
+            warm.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            historical_field_query(q, service_id, seconds, by)
+            field.append(time.perf_counter() - start)
+        results[f"historical_{label}_cold"] = summarize_timings(cold)
+        results[f"historical_{label}_warm"] = summarize_timings(warm)
+        results[f"historical_{label}_field"] = summarize_timings(field)
+    return results
+
+def bench_realtime(q, ticks):
+    from fastly_common.histogram import LatencyHistogram, histogram_from_samples
+    from fastly_common.realtime import get_real_time_data, filter_new_samples, summarize_samples
+    cursor = 0
+    seen_timestamps = set()
+    total_latency = LatencyHistogram()
+    failures = 0
+    start = time.perf_counter()
+    for _ in range(ticks):
+        result = get_real_time_data(q.API_TOKEN, "svc00042", cursor)
+        if result is None:
+            failures += 1
+            continue
+        stats_data, cursor = result
+        new_samples = filter_new_samples(stats_data, seen_timestamps)
+        summarize_samples(new_samples)
+        total_latency.merge(histogram_from_samples(new_samples))
+    elapsed = time.perf_counter() - start
+    return {'realtime_ticks': {'runs': ticks, 'failures': failures, 'ticks_per_second': round(ticks / elapsed, 1)}}
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPTS_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_previous_run(results_file, config):
+    previous = None
+    if os.path.exists(results_file):
+        with open(results_file) as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get('config') == config:
+                    previous = record
+    return previous
+
+def headline_value(result):
+    if 'ticks_per_second' in result:
+        return result['ticks_per_second'], "ticks/s"
+    if 'bytes' in result:
+        return result['bytes'], "B"
+    return result['median_ms'], "ms"
+
+def print_report(results, previous):
+    print(f"{'benchmark':<36} {'result':>14} {'previous':>14} {'change':>9}")
+    for name, result in results.items():
+        value, unit = headline_value(result)
+        line = f"{name:<36} {value:>10} {unit:<3}"
+        if previous and name in previous['results']:
+            previous_value, _ = headline_value(previous['results'][name])
+            change = (value - previous_value) / previous_value * 100 if previous_value else 0.0
+            line += f" {previous_value:>10} {unit:<3} {change:>+8.1f}%"
+        print(line)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark query_fastly.py against a local mock Fastly API")
+    parser.add_argument("--services", type=int, default=5000, help="services in the mock catalog")
+    parser.add_argument("--extra-fields", type=int, default=0, help="padding fields per bucket, to grow payloads")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every mock response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock responses that are HTTP 503")
+    parser.add_argument("--no-compress", dest="compress", action="store_false", help="serve uncompressed responses")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per timed benchmark")
+    parser.add_argument("--ticks", type=int, default=200, help="realtime polls to time")
+    parser.add_argument("--results", default=RESULTS_FILE, help="JSON lines file results are appended to")
+    parser.add_argument("--label", default=None, help="free-form note stored with the results")
+    return parser.parse_args(argv)
+
+def run(args):
+    config = MockConfig(args.services, args.extra_fields, args.latency_ms, args.error_rate, compress=args.compress)
+    server = start_mock_server(config)
+    results_file = os.path.abspath(args.results)
+    with tempfile.TemporaryDirectory(prefix="fastly-bench-") as workdir:
+        q = load_query_fastly(server.base_url, workdir)
+        results = {}
+        results.update(bench_name_resolution(q, args.repeat))
+        results.update(bench_historical(q, args.repeat))
+        results.update(bench_realtime(q, args.ticks))
+        os.chdir(BENCHMARKS_DIR)
+    server.shutdown()
+
+    run_config = dict(vars(config), repeat=args.repeat, ticks=args.ticks)
+    previous = load_previous_run(results_file, run_config)
+    record = {
+        'timestamp': datetime.utcnow().isoformat() + "Z",
+        'commit': current_commit(),
+        'label': args.label,
+        'config': run_config,
+        'mock_requests': server.requests,
+        'mock_bytes_sent': server.bytes_sent,
+        'results': results,
+    }
+    with open(results_file, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    print_report(results, previous)
+    print(f"\nMock API served {server.requests} requests ({server.bytes_sent} bytes); results appended to {results_file}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args(sys.argv[1:])))
@@ -0,0 +1,70 @@
+import numpy as np
+from fastly_common.historical import BUCKET_SECONDS, HISTORICAL_FETCH_WORKERS, stream_historical_range
+from fastly_common.timing import span
+
+class StatsAggregator:
+    def __init__(self, fields, by='minute'):
+        self.fields = list(fields)
+        self.bucket_seconds = BUCKET_SECONDS.get(by, 60)
+        self.count = 0
+        self.sums = np.zeros(len(self.fields))
+        self.mins = np.full(len(self.fields), np.inf)
+        self.maxs = np.full(len(self.fields), -np.inf)
+
+    @span("aggregation")
+    def update(self, buckets):
+        if not buckets:
+            return
+        # One pass over the buckets builds a (buckets x fields) matrix; every statistic is then a column reduction
+        values = np.array([[bucket.get(field) or 0 for field in self.fields] for bucket in buckets], dtype=np.float64)
+        self.sums += values.sum(axis=0)
+        np.minimum(self.mins, values.min(axis=0), out=self.mins)
+        np.maximum(self.maxs, values.max(axis=0), out=self.maxs)
+        self.count += len(values)
+
+    def results(self):
+        if not self.count:
+            return {field: {'sum': 0, 'min': 0, 'max': 0, 'mean': 0, 'rate': 0} for field in self.fields}
+        means = self.sums / self.count
+        rates = self.sums / (self.count * self.bucket_seconds)
+        return {
+            field: {
+                'sum': self.sums[i].item(),
+                'min': self.mins[i].item(),
+                'max': self.maxs[i].item(),
+                'mean': means[i].item(),
+                'rate': rates[i].item()
+            }
+            for i, field in enumerate(self.fields)
+        }
+
+def aggregate_historical_range(api_token, service_id, start_time, end_time, by='minute', fields=(), field=None, max_workers=HISTORICAL_FETCH_WORKERS):
+    # Streams each window straight into the aggregator, so a long range is never held in memory
+    aggregator = StatsAggregator(fields, by)
+    stream_historical_range(api_token, service_id, start_time, end_time, aggregator.update, by, field, max_workers)
+    return aggregator
+
+def aggregate_stored_range(api_token, service_id, start_time, end_time, by, fields):
+    # Full rows come through the local stats store batch by batch; the first one is kept to show which fields the API reports
+    from fastly_common.store import query_historical_range
+
+    aggregator = StatsAggregator(fields, by)
+    sample = []
+
+    def consume(batch):
+        if batch and not sample:
+            sample.append(batch[0])
+        aggregator.update(batch)
+
+    query_historical_range(api_token, service_id, start_time, end_time, consume, by)
+    return aggregator, sample
+
+def stream_field_aggregates(api_token, service_id, start_time, end_time, by, fields, max_workers=HISTORICAL_FETCH_WORKERS):
+    # Every statistic is per column, so each field is streamed from its own endpoint and aggregated alone
+    results = {}
+    buckets = 0
+    for field in fields:
+        aggregator = aggregate_historical_range(api_token, service_id, start_time, end_time, by, [field], field, max_workers)
+        results.update(aggregator.results())
+        buckets = max(buckets, aggregator.count)
+    return results, buckets
@@ -0,0 +1,243 @@
+from fastly_common.fields import COMMON_FIELDS
+from fastly_common.histogram import format_latency
+from fastly_common.slack import blocks_hash
+from fastly_common.timing import span
+
+FASTLY_DASHBOARD_HISTORICAL_URL = "https://manage.fastly.com/observability/dashboard/system/overview/historic/{service_id}?range={range}&region=all"
+FASTLY_DASHBOARD_REALTIME_URL = "https://manage.fastly.com/observability/dashboard/system/overview/realtime/{service_id}?range={range}"
+
+# Slack messages shared by query-fastly and query-fastly-realtime. The scripts only differ in the extra
+# header_fields each of them shows next to the service and environment.
+def format_value(value):
+    try:
+        value = float(value)  # Ensure the value is a number
+        if value >= 1000:
+            return f"{value / 1000:.1f}K ({int(value)})"
+        return str(int(value))
+    except (ValueError, TypeError):
+        return str(value)
+
+def generate_dashboard_url(service_id, range_str, is_realtime=False):
+    if is_realtime:
+        return FASTLY_DASHBOARD_REALTIME_URL.format(service_id=service_id, range=range_str)
+    else:
+        return FASTLY_DASHBOARD_HISTORICAL_URL.format(service_id=service_id, range=range_str)
+
+def generate_latency_slack_block(latency):
+    return {
+        "type": "section",
+        "fields": [
+            {
+                "type": "mrkdwn",
+                "text": f"*Miss Latency*\n*Last Interval:* `{format_latency(latency.get('interval'))}`\n*Overall:* `{format_latency(latency.get('total'))}`"
+            }
+        ]
+    }
+
+def get_change_emoji(interval_value, previous_value):
+    if interval_value > previous_value:
+        return " :arrow_up:"
+    elif interval_value < previous_value:
+        return " :small_red_triangle_down:"
+    return ""
+
+def generate_realtime_field_block(field_label, interval_value, change_emoji):
+    return {
+        "type": "section",
+        "fields": [
+            {
+                "type": "mrkdwn",
+                "text": f"*{field_label}*\n*Last Interval:* `{format_value(interval_value)}` {change_emoji}"
+            }
+        ]
+    }
+
+@span("slack_render")
+def generate_slack_blocks(summary, interval_summary, service_name, environment, service_id, is_realtime, previous_interval_summary=None, latency=None, header_fields=()):
+    blocks = [
+        {
+            "type": "header",
+            "text": {
+                "type": "plain_text",
+                "text": ":bar_chart: Real-Time Data Summary" if is_realtime else ":bar_chart: Historical Data Summary"
+            }
+        },
+        {
+            "type": "section",
+            "fields": [
+                {
+                    "type": "mrkdwn",
+                    "text": f"*Service Name:*\n<{generate_dashboard_url(service_id, '1m', is_realtime)}|{service_name}>"
+                },
+                {
+                    "type": "mrkdwn",
+                    "text": f"*Environment:*\n{environment.title()}"
+                }
+            ] + list(header_fields)
+        },
+        {"type": "divider"}
+    ]
+
+    for field, value in summary.items():
+        if not is_realtime:
+            blocks.append({
+                "type": "section",
+                "fields": [
+                    {
+                        "type": "mrkdwn",
+                        "text": f"*{field.replace('_', ' ').title()}*"
+                    }
+                ]
+            })
+        else:
+            interval_value = interval_summary.get(field, 0)
+            previous_value = previous_interval_summary.get(field, 0) if previous_interval_summary else 0
+            blocks.append(generate_realtime_field_block(field.replace('_', ' ').title(), interval_value, get_change_emoji(interval_value, previous_value)))
+
+    if is_realtime and latency:
+        blocks.append(generate_latency_slack_block(latency))
+
+    if is_realtime:
+        blocks.append({
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": "_You can stop the stream by clicking on the 'Stop' button on this thread._"
+            }
+        })
+
+    return blocks
+
+@span("slack_render")
+def generate_final_slack_blocks_with_intervals(summary, interval_summary, service_name, environment, service_id, latency=None, header_fields=()):
+    blocks = [
+        {
+            "type": "header",
+            "text": {
+                "type": "plain_text",
+                "text": ":bar_chart: Final Real-Time Data Summary"
+            }
+        },
+        {
+            "type": "section",
+            "fields": [
+                {
+                    "type": "mrkdwn",
+                    "text": f"*Service Name:*\n<{generate_dashboard_url(service_id, '1m', is_realtime=True)}|{service_name}>"
+                },
+                {
+                    "type": "mrkdwn",
+                    "text": f"*Environment:*\n{environment.title()}"
+                }
+            ] + list(header_fields)
+        },
+        {"type": "divider"}
+    ]
+
+    for field, value in summary.items():
+        interval_value = interval_summary.get(field, 0)
+        blocks.append({
+            "type": "section",
+            "fields": [
+                {
+                    "type": "mrkdwn",
+                    "text": f"*{field.replace('_', ' ').title()}*\n*Last Interval:* `{format_value(interval_value)}`"
+                }
+            ]
+        })
+
+    if latency:
+        blocks.append(generate_latency_slack_block(latency))
+
+    return blocks
+
+class RealtimeSlackRenderer:
+    def __init__(self, service_name, environment, service_id, fields=COMMON_FIELDS, header_fields=()):
+        # The header, service details and stop note never change during a stream, so they are rendered once
+        self.blocks = generate_slack_blocks({field: 0 for field in fields}, {}, service_name, environment, service_id, is_realtime=True, header_fields=header_fields)
+        self.field_labels = {field: field.replace('_', ' ').title() for field in fields}
+        self.field_positions = {field: 3 + i for i, field in enumerate(fields)}  # After header, details and divider
+        self.field_values = {}
+        self.latency_position = None
+        self.latency_values = None
+        self.content_hash = blocks_hash(self.blocks)
+
+    @span("slack_render")
+    def render(self, interval_summary, previous_interval_summary=None, latency=None):
+        # Blocks are replaced rather than edited, so a frame handed to the publisher never changes under it
+        blocks = None
+        for field, position in self.field_positions.items():
+            interval_value = interval_summary.get(field, 0)
+            previous_value = previous_interval_summary.get(field, 0) if previous_interval_summary else 0
+            value = (interval_value, get_change_emoji(interval_value, previous_value))
+            if self.field_values.get(field) == value:
+                continue
+            blocks = blocks or list(self.blocks)
+            blocks[position] = generate_realtime_field_block(self.field_labels[field], *value)
+            self.field_values[field] = value
+
+        if latency and latency != self.latency_values:
+            blocks = blocks or list(self.blocks)
+            if self.latency_position is None:
+                self.latency_position = len(blocks) - 1
+                blocks.insert(self.latency_position, generate_latency_slack_block(latency))
+            else:
+                blocks[self.latency_position] = generate_latency_slack_block(latency)
+            self.latency_values = latency
+
+        if blocks is not None:
+            self.blocks = blocks
+            self.content_hash = blocks_hash(blocks)
+        return self.blocks
+
+@span("slack_render")
+def generate_multi_service_slack_blocks(stream_states, environment, is_final=False, header_fields=()):
+    blocks = [
+        {
+            "type": "header",
+            "text": {
+                "type": "plain_text",
+                "text": ":bar_chart: Final Real-Time Data Summary" if is_final else ":bar_chart: Real-Time Data Summary"
+            }
+        },
+        {
+            "type": "section",
+            "fields": [
+                {
+                    "type": "mrkdwn",
+                    "text": f"*Services:*\n{len(stream_states)}"
+                },
+                {
+                    "type": "mrkdwn",
+                    "text": f"*Environment:*\n{environment.title()}"
+                }
+            ] + list(header_fields)
+        },
+        {"type": "divider"}
+    ]
+
+    for state in stream_states:
+        lines = [f"*<{generate_dashboard_url(state['service_id'], '1m', is_realtime=True)}|{state['service_name']}>*"]
+        if state['error']:
+            lines.append("_Unable to retrieve real-time data on the last interval._")
+        for field in COMMON_FIELDS:
+            lines.append(f"{field.replace('_', ' ').title()}: `{format_value(state['interval_stats'].get(field, 0))}` (total `{format_value(state['total_stats'][field])}`)")
+        lines.append(f"Miss Latency: `{format_latency(state['interval_latency'])}` (overall `{format_latency(state['total_latency'].percentiles())}`)")
+        blocks.append({
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": "\n".join(lines)
+            }
+        })
+
+    if not is_final:
+        blocks.append({
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": "_You can stop the stream by clicking on the 'Stop' button on this thread._"
+            }
+        })
+
+    return blocks
@@ -0,0 +1,110 @@
+import os
+import json
+import fcntl
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from fastly_common.utils import debug_print
+from fastly_common.output import info_print
+from fastly_common.timing import span
+
+CACHE_EXPIRY_HOURS = 24
+
+# Parsed cache files, reused by long-running processes until the file on disk changes
+_memory_cache = {}
+
+@span("cache_load")
+def read_cache_entry(cache_file):
+    try:
+        if os.path.exists(cache_file):
+            mtime = os.stat(cache_file).st_mtime_ns
+            cached = _memory_cache.get(cache_file)
+            if cached and cached[0] == mtime:
+                return cached[1], cached[2]
+            with open(cache_file, 'r') as f:
+                cache_data = json.load(f)
+                entry = (cache_data['data'], datetime.fromisoformat(cache_data['timestamp']))
+            _memory_cache[cache_file] = (mtime,) + entry
+            return entry
+    except Exception as e:
+        info_print(f"Error loading cache from {cache_file}: {e}")
+    return None, None
+
+def is_fresh(cache_timestamp, expiry_hours=CACHE_EXPIRY_HOURS):
+    return cache_timestamp is not None and datetime.utcnow() - cache_timestamp < timedelta(hours=expiry_hours)
+
+def load_cache(cache_file, expiry_hours=CACHE_EXPIRY_HOURS):
+    data, cache_timestamp = read_cache_entry(cache_file)
+    if is_fresh(cache_timestamp, expiry_hours):
+        return data
+    return None
+
+def save_cache(cache_file, data):
+    try:
+        cache_data = {
+            'timestamp': datetime.utcnow().isoformat(),
+            'data': data
+        }
+        # Write to a temporary file in the same directory and rename it over the cache,
+        # so readers only ever see the old file or the complete new one
+        cache_dir = os.path.dirname(os.path.abspath(cache_file))
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=f".{os.path.basename(cache_file)}.")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(cache_data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, cache_file)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except Exception as e:
+        info_print(f"Error saving cache to {cache_file}: {e}")
+
+@contextmanager
+def cache_lock(cache_file, blocking=True):
+    with open(f"{cache_file}.lock", 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def refresh_cache(cache_file, refresh, expiry_hours=CACHE_EXPIRY_HOURS, blocking=True):
+    with cache_lock(cache_file, blocking) as acquired:
+        if not acquired:
+            debug_print(f"Another process is already refreshing {cache_file}.")
+            return None
+        # Whoever held the lock before us may have just refreshed the cache
+        data, cache_timestamp = read_cache_entry(cache_file)
+        if is_fresh(cache_timestamp, expiry_hours):
+            return data
+        data = refresh()
+        if data:
+            save_cache(cache_file, data)
+        return data
+
+def start_background_refresh(cache_file, refresh, expiry_hours=CACHE_EXPIRY_HOURS, refresh_command=None):
+    if refresh_command:
+        # A short-lived command hands the refresh to a detached process, so it can exit without waiting for it
+        subprocess.Popen(refresh_command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    else:
+        # A long-running process such as the daemon simply refreshes on a thread of its own
+        threading.Thread(target=refresh_cache, args=(cache_file, refresh, expiry_hours, False), daemon=True).start()
+
+def load_or_refresh_cache(cache_file, refresh, expiry_hours=CACHE_EXPIRY_HOURS, refresh_command=None):
+    data, cache_timestamp = read_cache_entry(cache_file)
+    if data and is_fresh(cache_timestamp, expiry_hours):
+        return data
+    if data:
+        # Stale: answer from the old entry now and let a single refresher update it in the background
+        debug_print(f"Serving stale {cache_file} while it is refreshed in the background.")
+        start_background_refresh(cache_file, refresh, expiry_hours, refresh_command)
+        return data
+    return refresh_cache(cache_file, refresh, expiry_hours)
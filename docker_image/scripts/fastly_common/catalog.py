@@ -0,0 +1,108 @@
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from fastly_common.session import fastly_get, HISTORICAL_BASE_URL, HTTP_POOL_SIZE
+from fastly_common.timing import span
+from fastly_common.jsoncodec import decode_response
+from fastly_common.output import info_print, in_output_context
+
+SERVICES_PER_PAGE = int(os.getenv("FASTLY_SERVICES_PER_PAGE", "1000"))  # Largest page size accepted by /service
+CATALOG_FETCH_WORKERS = min(int(os.getenv("FASTLY_CATALOG_FETCH_WORKERS", "4")), HTTP_POOL_SIZE)
+
+def fetch_services_page(api_token, page, per_page=SERVICES_PER_PAGE):
+    params = {
+        "direction": "ascend",
+        "page": page,
+        "per_page": per_page,
+        "sort": "created"
+    }
+    response = fastly_get(api_token, f"{HISTORICAL_BASE_URL}/service", params=params)
+    response.raise_for_status()
+    with span("json_decode"):
+        return decode_response(response)
+
+def fetch_services(api_token, per_page=SERVICES_PER_PAGE, max_workers=CATALOG_FETCH_WORKERS):
+    import requests
+
+    all_services = {}
+    try:
+        first_page = fetch_services_page(api_token, 1, per_page)
+        for service in first_page:
+            all_services[service['name']] = service['id']
+        if len(first_page) < per_page:
+            return all_services
+
+        # More pages exist: request them in concurrent batches until a short page marks the end
+        next_page = 2
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                pages = range(next_page, next_page + max_workers)
+                results = executor.map(in_output_context(lambda page: fetch_services_page(api_token, page, per_page)), pages)
+                reached_end = False
+                for services in results:
+                    for service in services:
+                        all_services[service['name']] = service['id']
+                    if len(services) < per_page:
+                        reached_end = True
+                        break
+                if reached_end:
+                    break
+                next_page += max_workers
+    except requests.exceptions.RequestException as e:
+        # A partial catalog would be cached as complete, so a failed page fails the whole fetch
+        info_print(f"Error fetching services from Fastly API: {e}")
+        return None
+    return all_services
+
+NGRAM_SIZE = 3
+MAX_NGRAM_CANDIDATES = 25
+TRIE_TERMINAL = ""  # Trie keys are single characters, so the empty string never collides with one
+
+def name_ngrams(name, size=NGRAM_SIZE):
+    padded = f" {name.lower()} "
+    if len(padded) <= size:
+        return {padded}
+    return {padded[i:i + size] for i in range(len(padded) - size + 1)}
+
+def catalog_fingerprint(service_names):
+    # Any rename, addition or removal changes it, even when the number of services stays the same
+    return hashlib.sha1("\n".join(sorted(service_names)).encode()).hexdigest()
+
+def build_service_index(service_names):
+    exact = {}
+    trie = {}
+    ngrams = {}
+    for name in service_names:
+        lowered = name.lower()
+        exact.setdefault(lowered, name)
+        node = trie
+        for char in lowered:
+            node = node.setdefault(char, {})
+        node.setdefault(TRIE_TERMINAL, []).append(name)
+        for gram in name_ngrams(name):
+            ngrams.setdefault(gram, []).append(name)
+    return {'exact': exact, 'trie': trie, 'ngrams': ngrams, 'size': len(service_names), 'fingerprint': catalog_fingerprint(service_names)}
+
+def prefix_candidates(index, prefix):
+    node = index['trie']
+    for char in prefix.lower():
+        node = node.get(char)
+        if node is None:
+            return []
+    candidates = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        for key, child in node.items():
+            if key == TRIE_TERMINAL:
+                candidates.extend(child)
+            else:
+                stack.append(child)
+    return candidates
+
+def ngram_candidates(index, query, limit=MAX_NGRAM_CANDIDATES):
+    counts = {}
+    for gram in name_ngrams(query):
+        for name in index['ngrams'].get(gram, ()):
+            counts[name] = counts.get(name, 0) + 1
+    return sorted(counts, key=counts.get, reverse=True)[:limit]
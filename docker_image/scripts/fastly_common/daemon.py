@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import socket
+import threading
+import socketserver
+
+# Only the standard library is imported here so the thin client starts without loading the heavy dependencies
+DAEMON_SOCKET = os.getenv("FASTLY_DAEMON_SOCKET")  # Unset: each command gets its own socket, see daemon_socket_path
+
+def daemon_socket_path(command):
+    if DAEMON_SOCKET:
+        return DAEMON_SOCKET
+    # query_fastly.py and the installed query-fastly share a socket, query-fastly-realtime gets another one
+    name = os.path.basename(command)
+    if name.endswith(".py"):
+        name = name[:-3]
+    return f"/tmp/{name.replace('_', '-')}.sock"
+
+def daemon_running(socket_path):
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        connection.close()
+
+class ThreadLocalStream:
+    def __init__(self, default):
+        self.default = default
+        self.local = threading.local()
+
+    def target(self):
+        return getattr(self.local, 'stream', None) or self.default
+
+    def write(self, data):
+        return self.target().write(data)
+
+    def flush(self):
+        return self.target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.default, name)
+
+class SocketStream:
+    def __init__(self, connection, name, lock):
+        self.connection = connection
+        self.name = name
+        self.lock = lock
+
+    def write(self, data):
+        if data:
+            send_message(self.connection, self.lock, {"stream": self.name, "data": data})
+        return len(data)
+
+    def flush(self):
+        pass
+
+def send_message(connection, lock, message):
+    with lock:
+        connection.sendall((json.dumps(message) + "\n").encode())
+
+class QueryHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # A connection closed without a request, such as another daemon checking whether this one is alive
+            return
+        request = json.loads(line)
+        lock = threading.Lock()
+        stdout = SocketStream(self.connection, "stdout", lock)
+        stderr = SocketStream(self.connection, "stderr", lock)
+        # Output of this query goes back to its own client, even with other queries running concurrently
+        sys.stdout.local.stream = stdout
+        sys.stderr.local.stream = stderr
+        try:
+            exit_code = self.server.run_cli(request["args"], slack_channel=request.get("slack_channel"), thread_ts=request.get("thread_ts"), output_format=request.get("output_format"))
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 1
+        except Exception as e:
+            print(f"An unexpected error occurred: {e}", file=sys.stderr)
+            exit_code = 1
+        finally:
+            sys.stdout.local.stream = None
+            sys.stderr.local.stream = None
+        send_message(self.connection, lock, {"exit": exit_code or 0})
+
+class QueryServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve(run_cli, socket_path):
+    if daemon_running(socket_path):
+        print(f"Another daemon is already listening on {socket_path}", file=sys.stderr)
+        return 1
+    # Nothing answers on it, so the socket file was left behind by a daemon that did not shut down cleanly
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    sys.stdout = ThreadLocalStream(sys.stdout)
+    sys.stderr = ThreadLocalStream(sys.stderr)
+    server = QueryServer(socket_path, QueryHandler)
+    server.run_cli = run_cli
+    os.chmod(socket_path, 0o600)
+    print(f"Listening for queries on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+    return 0
+
+def run_client(args, socket_path):
+    request = {
+        "args": args,
+        "slack_channel": os.getenv("SLACK_CHANNEL_ID"),
+        "thread_ts": os.getenv("SLACK_THREAD_TS"),
+        "output_format": os.getenv("FASTLY_OUTPUT_FORMAT")
+    }
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+    except OSError:
+        connection.close()
+        return None
+
+    with connection, connection.makefile('r') as responses:
+        connection.sendall((json.dumps(request) + "\n").encode())
+        for line in responses:
+            message = json.loads(line)
+            if "exit" in message:
+                return message["exit"]
+            stream = sys.stderr if message["stream"] == "stderr" else sys.stdout
+            stream.write(message["data"])
+            stream.flush()
+    return 1
@@ -0,0 +1,72 @@
+# Seed list so field names resolve before the first stats response has been seen
+DEFAULT_STATS_FIELDS = [
+    "requests", "hits", "miss", "pass", "synth", "errors", "restarts", "hit_ratio",
+    "hits_time", "miss_time", "bandwidth", "body_size", "header_size",
+    "req_body_bytes", "req_header_bytes", "resp_body_bytes", "resp_header_bytes",
+    "bereq_body_bytes", "bereq_header_bytes", "uncacheable", "pipe", "shield",
+    "shield_resp_body_bytes", "shield_resp_header_bytes", "all_pass_requests",
+    "edge_requests", "edge_resp_body_bytes", "edge_resp_header_bytes",
+    "origin_fetches", "origin_fetch_body_bytes", "origin_fetch_header_bytes",
+    "ipv6", "tls", "http2", "http3", "video", "pci", "log", "attack_blocked_req_body_bytes",
+    "status_1xx", "status_2xx", "status_3xx", "status_4xx", "status_5xx",
+    "status_200", "status_204", "status_206", "status_301", "status_302", "status_304",
+    "status_400", "status_401", "status_403", "status_404", "status_406", "status_408",
+    "status_409", "status_410", "status_412", "status_413", "status_414", "status_415",
+    "status_416", "status_417", "status_429", "status_500", "status_501", "status_502",
+    "status_503", "status_504", "status_505",
+]
+COMMON_FIELDS = ["status_5xx", "requests", "hits", "miss", "all_pass_requests"]  # Shown in overviews and realtime streams
+FIELD_ALIASES = {
+    "cache hits": "hits",
+    "cache misses": "miss",
+    "misses": "miss",
+    "passes": "pass",
+    "errors 5xx": "status_5xx",
+    "server errors": "status_5xx",
+    "client errors": "status_4xx",
+}
+MAX_FIELD_SUGGESTIONS = 5
+
+def normalize_field_name(name):
+    return ' '.join(name.lower().replace('_', ' ').replace('-', ' ').split())
+
+def field_aliases(field):
+    aliases = []
+    if field.startswith("status_"):
+        code = field[len("status_"):]
+        aliases.extend([code, f"{code} errors", f"{code} error", f"{code} status", f"{code}s"])
+    return aliases
+
+def build_field_schema(fields, learned=False):
+    normalized = {normalize_field_name(field): field for field in fields}
+    aliases = {}
+    for field in fields:
+        for alias in field_aliases(field):
+            aliases.setdefault(normalize_field_name(alias), field)
+    for alias, field in FIELD_ALIASES.items():
+        if field in fields:
+            aliases.setdefault(normalize_field_name(alias), field)
+
+    # Closest neighbours of every field, so an exact or alias hit needs no fuzzy scoring for its suggestions
+    from fuzzywuzzy import process, fuzz
+    processed_fields = list(normalized.keys())
+    neighbours = {}
+    for processed, field in normalized.items():
+        matches = process.extract(processed, processed_fields, limit=MAX_FIELD_SUGGESTIONS + 1, scorer=fuzz.WRatio)
+        neighbours[field] = [normalized[match] for match, score in matches if normalized[match] != field][:MAX_FIELD_SUGGESTIONS]
+    # learned is set once the fields of a real stats response have been merged in; until then only the seed list is known
+    return {'fields': list(fields), 'normalized': normalized, 'aliases': aliases, 'neighbours': neighbours, 'learned': learned}
+
+def lookup_field(schema, field_name, threshold):
+    # Returns the field, suggestions for close alternatives, and whether the field was only a fuzzy match
+    key = normalize_field_name(field_name)
+    field = schema['normalized'].get(key) or schema['aliases'].get(key)
+    if field:
+        return field, schema['neighbours'].get(field, []), False
+
+    from fuzzywuzzy import process, fuzz
+    matches = process.extract(key, list(schema['normalized'].keys()), limit=MAX_FIELD_SUGGESTIONS, scorer=fuzz.WRatio)
+    suggestions = [schema['normalized'][match] for match, score in matches]
+    if not matches or matches[0][1] < threshold:
+        return None, suggestions, True
+    return suggestions[0], suggestions[1:], True
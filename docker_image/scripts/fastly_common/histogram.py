@@ -0,0 +1,64 @@
+from bisect import bisect_left
+
+MISS_HISTOGRAM_FIELD = "miss_histogram"
+LATENCY_PERCENTILES = (50, 95, 99)
+# Upper bucket edges in milliseconds, matching the resolution rt.fastly.com reports latency histograms at.
+# Each miss_histogram key is the upper bound of its span, so bucket i covers (edge i-1, edge i] and the first starts at 0.
+LATENCY_BUCKET_EDGES = (
+    list(range(10, 1000, 10)) +
+    list(range(1000, 3000, 50)) +
+    list(range(3000, 10000, 100)) +
+    list(range(10000, 20000, 500)) +
+    list(range(20000, 60001, 1000))
+)
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKET_EDGES)
+        self.total = 0
+
+    def add(self, histogram):
+        for key, count in histogram.items():
+            try:
+                latency = float(key)
+            except (TypeError, ValueError):
+                continue
+            # Anything past the last edge is counted in the last bucket
+            index = min(bisect_left(LATENCY_BUCKET_EDGES, latency), len(LATENCY_BUCKET_EDGES) - 1)
+            self.counts[index] += count
+            self.total += count
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.total += other.total
+
+    def percentile(self, percent):
+        if not self.total:
+            return None
+        target = self.total * percent / 100
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if count and cumulative + count >= target:
+                lower = LATENCY_BUCKET_EDGES[index - 1] if index else 0
+                upper = LATENCY_BUCKET_EDGES[index]
+                # Interpolate linearly inside the bucket the target falls in
+                return lower + (upper - lower) * (target - cumulative) / count
+            cumulative += count
+        return float(LATENCY_BUCKET_EDGES[-1])
+
+    def percentiles(self, percents=LATENCY_PERCENTILES):
+        return {f"p{percent}": self.percentile(percent) for percent in percents}
+
+def histogram_from_samples(samples, field=MISS_HISTOGRAM_FIELD):
+    histogram = LatencyHistogram()
+    for data_point in samples:
+        sample_histogram = data_point.get('aggregated', {}).get(field)
+        if sample_histogram:
+            histogram.add(sample_histogram)
+    return histogram
+
+def format_latency(percentiles):
+    if not percentiles or all(value is None for value in percentiles.values()):
+        return "n/a"
+    return " / ".join(f"{name} {value:.0f} ms" if value is not None else f"{name} n/a" for name, value in percentiles.items())
@@ -0,0 +1,85 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastly_common.session import fastly_get, HISTORICAL_BASE_URL, HTTP_POOL_SIZE
+from fastly_common.utils import debug_print
+from fastly_common.output import in_output_context
+from fastly_common.timing import span
+from fastly_common.jsonstream import iter_json_array
+from fastly_common.jsoncodec import decode_response
+
+BUCKET_SECONDS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+HISTORICAL_CHUNK_BUCKETS = int(os.getenv("FASTLY_HISTORICAL_CHUNK_BUCKETS", "240"))  # Buckets requested per chunk
+HISTORICAL_FETCH_WORKERS = min(int(os.getenv("FASTLY_HISTORICAL_FETCH_WORKERS", "4")), HTTP_POOL_SIZE)
+STREAM_CHUNK_BYTES = 64 * 1024
+STREAM_BATCH_BUCKETS = int(os.getenv("FASTLY_STREAM_BATCH_BUCKETS", "500"))  # Buckets decoded before each batch is handed on
+
+def build_stats_url(service_id, start_time, end_time, by='minute', field=None):
+    base_url = f"{HISTORICAL_BASE_URL}/stats/service/{service_id}"
+    if field:
+        return f"{base_url}/field/{field}?from={int(start_time)}&to={int(end_time)}&by={by}&region=global"
+    return f"{base_url}?from={int(start_time)}&to={int(end_time)}&by={by}&region=global"
+
+def split_time_range(start_time, end_time, by='minute', chunk_buckets=HISTORICAL_CHUNK_BUCKETS):
+    start_time, end_time = int(start_time), int(end_time)
+    chunk_seconds = BUCKET_SECONDS.get(by, 60) * chunk_buckets
+    if end_time - start_time <= chunk_seconds:
+        return [(start_time, end_time)]
+
+    # Window edges sit on multiples of the chunk size so the same range always splits the same way
+    windows = []
+    window_start = start_time
+    window_end = (start_time // chunk_seconds + 1) * chunk_seconds
+    while window_start < end_time:
+        windows.append((window_start, min(window_end, end_time)))
+        window_start = window_end
+        window_end += chunk_seconds
+    return windows
+
+def fetch_stats_chunk(api_token, service_id, start_time, end_time, by='minute', field=None):
+    # Transient failures are retried with backoff inside fastly_get; anything left here is final
+    url = build_stats_url(service_id, start_time, end_time, by, field)
+    debug_print(f"API URL: {url}")
+    response = fastly_get(api_token, url)
+    response.raise_for_status()
+    with span("json_decode"):
+        return decode_response(response)['data']
+
+def iter_stats_chunk(api_token, service_id, start_time, end_time, by='minute', field=None):
+    # Buckets are decoded as the body arrives, so neither the raw text nor the full list is ever held
+    url = build_stats_url(service_id, start_time, end_time, by, field)
+    debug_print(f"API URL (streaming): {url}")
+    response = fastly_get(api_token, url, stream=True)
+    try:
+        response.raise_for_status()
+        yield from iter_json_array(response.iter_content(chunk_size=STREAM_CHUNK_BYTES), "data")
+    finally:
+        response.close()
+
+def iter_window_batches(api_token, service_id, window, by, field, is_last, batch_size=STREAM_BATCH_BUCKETS):
+    batch = []
+    for bucket in iter_stats_chunk(api_token, service_id, window[0], window[1], by, field):
+        # The bucket on a shared window edge is returned by both windows; it is kept from the later one
+        if not is_last and (bucket.get('start_time') or 0) >= window[1]:
+            continue
+        batch.append(bucket)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def stream_historical_range(api_token, service_id, start_time, end_time, consume, by='minute', field=None, max_workers=HISTORICAL_FETCH_WORKERS):
+    # Windows are streamed concurrently and handed to consume one batch at a time, so at most max_workers
+    # batches are in memory at once and consume needs no locking of its own
+    windows = split_time_range(start_time, end_time, by)
+    consume_lock = threading.Lock()
+
+    def stream_window(i):
+        for batch in iter_window_batches(api_token, service_id, windows[i], by, field, i == len(windows) - 1):
+            with consume_lock:
+                consume(batch)
+
+    debug_print(f"Streaming {len(windows)} chunks with {max_workers} workers...")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(in_output_context(stream_window), range(len(windows))))
@@ -0,0 +1,43 @@
+import os
+import json
+import importlib
+import threading
+
+JSON_DECODER = os.getenv("FASTLY_JSON_DECODER", "auto").lower()  # "auto", or one of "orjson", "ujson", "json"
+FAST_DECODERS = ("orjson", "ujson")  # Tried in order when JSON_DECODER is "auto"
+
+_decoder = None
+_decoder_lock = threading.Lock()
+
+def load_decoder(name):
+    if name == "json":
+        return name, json.loads
+    return name, importlib.import_module(name).loads
+
+def select_decoder(preference=JSON_DECODER):
+    candidates = FAST_DECODERS if preference == "auto" else (preference,)
+    for name in candidates:
+        try:
+            return load_decoder(name)
+        except ImportError:
+            continue
+    return load_decoder("json")
+
+def get_decoder():
+    global _decoder
+    with _decoder_lock:
+        if _decoder is None:
+            _decoder = select_decoder()
+        return _decoder
+
+def loads(data):
+    # All supported decoders take the raw bytes, which skips building an intermediate str
+    return get_decoder()[1](data)
+
+def decode_response(response):
+    # Raised as a requests error, like response.json(), so callers' RequestException handlers still cover a bad body
+    from requests.exceptions import InvalidJSONError
+    try:
+        return loads(response.content)
+    except ValueError as e:
+        raise InvalidJSONError(f"Invalid JSON in response from {response.url}: {e}", response=response) from e
@@ -0,0 +1,90 @@
+import json
+import codecs
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+_NUMBER_CHARS = "0123456789.eE+-"
+
+# Incremental reader over an iterable of byte chunks. Only the text not yet consumed is kept, so a
+# document can be walked value by value without ever holding all of it.
+class ChunkReader:
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.exhausted = False
+
+    def fill(self):
+        for chunk in self.chunks:
+            text = self.decoder.decode(chunk)
+            if text:
+                # Drop what has been consumed before growing the buffer
+                self.buffer = self.buffer[self.pos:] + text
+                self.pos = 0
+                return True
+        if not self.exhausted:
+            self.exhausted = True
+            self.buffer = self.buffer[self.pos:] + self.decoder.decode(b"", final=True)
+            self.pos = 0
+        return False
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError("Unexpected end of JSON document")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos} of the JSON document")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Most likely the value runs past the end of the buffer; read on and try again
+                if not self.fill():
+                    raise
+                continue
+            # A number cut by a chunk boundary can still parse as a shorter one ("0." reads as 0), so unless
+            # something other than number characters follows it, read on and decode it again
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and not self.exhausted:
+                tail = end
+                while tail < len(self.buffer) and self.buffer[tail] in _NUMBER_CHARS:
+                    tail += 1
+                if tail == len(self.buffer) and self.fill():
+                    continue
+            self.pos = end
+            return value
+
+# Yields the elements of the array stored under key in a top-level JSON object, one at a time
+def iter_json_array(chunks, key):
+    reader = ChunkReader(chunks)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        name = reader.value()
+        reader.expect(":")
+        if name == key and reader.peek() == "[":
+            reader.pos += 1
+            if reader.peek() == "]":
+                return
+            while True:
+                yield reader.value()
+                # Whatever follows the array is not needed, so the rest of the document is never read
+                if reader.peek() == "]":
+                    return
+                reader.expect(",")
+        else:
+            reader.value()
+        if reader.peek() == "}":
+            return
+        reader.expect(",")
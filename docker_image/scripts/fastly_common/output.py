@@ -0,0 +1,49 @@
+import os
+import sys
+import json
+import time
+import threading
+
+OUTPUT_FORMAT = os.getenv("FASTLY_OUTPUT_FORMAT", "text").lower()  # "text" or "ndjson"
+
+# The daemon answers each client on a thread of its own, in the output format that client asked for
+_local = threading.local()
+
+def current_output_format():
+    return getattr(_local, 'output_format', None) or OUTPUT_FORMAT
+
+def set_output_format(output_format):
+    _local.output_format = output_format.lower() if output_format else None
+
+def capture_output_context():
+    # Under the daemon stdout/stderr are routed per thread as well, so worker threads take on their creator's client
+    streams = [(stream, stream.target()) for stream in (sys.stdout, sys.stderr) if hasattr(stream, 'local')]
+    return streams, current_output_format()
+
+def restore_output_context(context):
+    streams, output_format = context
+    for stream, target in streams:
+        stream.local.stream = target
+    set_output_format(output_format)
+
+def in_output_context(fn):
+    # For work handed to a thread pool: the worker writes to the submitting query's client, in its output format
+    context = capture_output_context()
+
+    def run(*args, **kwargs):
+        restore_output_context(context)
+        return fn(*args, **kwargs)
+    return run
+
+def ndjson_enabled():
+    return current_output_format() == "ndjson"
+
+def info_print(message):
+    # In NDJSON mode stdout carries only records, so human readable messages move to stderr
+    print(message, file=sys.stderr if ndjson_enabled() else sys.stdout)
+
+def emit_record(record_type, **fields):
+    record = {"type": record_type, "timestamp": time.time()}
+    record.update(fields)
+    sys.stdout.write(json.dumps(record, separators=(',', ':')) + "\n")
+    sys.stdout.flush()
@@ -0,0 +1,111 @@
+import os
+import sys
+import threading
+from collections import deque
+from fastly_common.output import capture_output_context, restore_output_context
+
+SINK_QUEUE_SIZE = int(os.getenv("FASTLY_SINK_QUEUE_SIZE", "64"))  # Frames a console or NDJSON sink may fall behind by
+_CLOSED = object()
+
+# Bounded hand-off between two stages. A full channel never blocks the producer: the incoming item is
+# merged into the newest queued one when a merge function is given, otherwise the oldest item is dropped.
+class BoundedChannel:
+    def __init__(self, maxsize, merge=None):
+        self.maxsize = maxsize
+        self.merge = merge
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+        self.coalesced = 0
+
+    def put(self, item):
+        with self.condition:
+            if self.closed:
+                return
+            if len(self.items) >= self.maxsize:
+                if self.merge:
+                    self.items[-1] = self.merge(self.items[-1], item)
+                    self.coalesced += 1
+                    return
+                self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self.condition.notify()
+
+    def get(self):
+        with self.condition:
+            while not self.items and not self.closed:
+                self.condition.wait()
+            return self.items.popleft() if self.items else _CLOSED
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            if item is _CLOSED:
+                return
+            yield item
+
+def latest(previous, current):
+    return current
+
+# Runs handler over everything put on its channel in a thread of its own, passing non-None results on to
+# the output channels. Closing the input channel drains it, then closes the outputs in turn.
+class Stage:
+    def __init__(self, name, channel, handler, outputs=()):
+        self.name = name
+        self.channel = channel
+        self.handler = handler
+        self.outputs = list(outputs)
+        self.output_context = capture_output_context()
+        self.thread = threading.Thread(target=self._run, name=f"pipeline-{name}", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        restore_output_context(self.output_context)
+        try:
+            for item in self.channel:
+                try:
+                    result = self.handler(item)
+                except Exception as e:
+                    print(f"Error in {self.name} stage: {e}", file=sys.stderr)
+                    continue
+                if result is not None:
+                    for output in self.outputs:
+                        output.put(result)
+        finally:
+            for output in self.outputs:
+                output.close()
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+# A poller feeding an aggregation stage that fans frames out to one channel per sink
+class StreamPipeline:
+    def __init__(self, aggregate, merge_polls, sinks):
+        self.polls = BoundedChannel(SINK_QUEUE_SIZE, merge=merge_polls)
+        self.sink_channels = {name: BoundedChannel(maxsize, merge) for name, handler, maxsize, merge in sinks}
+        self.sinks = [Stage(name, self.sink_channels[name], handler) for name, handler, maxsize, merge in sinks]
+        self.aggregation = Stage("aggregation", self.polls, aggregate, self.sink_channels.values())
+
+    def submit(self, poll):
+        self.polls.put(poll)
+
+    def close(self):
+        # Polls already collected are still aggregated and every sink drains what it was handed
+        self.polls.close()
+        self.aggregation.join()
+        for sink in self.sinks:
+            sink.join()
+
+    def stats(self):
+        stats = {'polls_coalesced': self.polls.coalesced}
+        for name, channel in self.sink_channels.items():
+            stats[f"{name}_dropped"] = channel.dropped
+            stats[f"{name}_coalesced"] = channel.coalesced
+        return stats
@@ -0,0 +1,290 @@
+from concurrent.futures import ThreadPoolExecutor
+from fastly_common.session import fastly_get, REAL_TIME_BASE_URL
+from fastly_common.fields import COMMON_FIELDS
+from fastly_common.histogram import LatencyHistogram, histogram_from_samples, format_latency
+from fastly_common.output import ndjson_enabled, info_print, emit_record, in_output_context
+from fastly_common.blocks import format_value, RealtimeSlackRenderer, generate_final_slack_blocks_with_intervals, generate_multi_service_slack_blocks
+from fastly_common.slack import get_slack_client, post_message, SlackMessagePublisher
+from fastly_common.timing import span
+from fastly_common.jsoncodec import decode_response
+from fastly_common.scheduler import TickScheduler
+from fastly_common.pipeline import StreamPipeline, SINK_QUEUE_SIZE, latest
+from fastly_common.utils import debug_print
+
+DEFAULT_WAIT_INTERVAL = 1  # Default wait interval for real-time streaming
+SEEN_SAMPLES_WINDOW = 300  # Seconds of real-time sample timestamps remembered for de-duplication
+
+def get_real_time_data(api_token, service_id, timestamp=0):
+    import requests
+
+    url = f"{REAL_TIME_BASE_URL}/v1/channel/{service_id}/ts/{int(timestamp)}"
+    debug_print(f"Real-Time API URL: {url}")
+
+    try:
+        debug_print("Retrieving real-time data...")
+        response = fastly_get(api_token, url)
+        response.raise_for_status()
+        with span("json_decode"):
+            real_time_data = decode_response(response)
+        # Timestamp is the cursor for the next poll; passing it back only returns newer samples
+        return real_time_data['Data'], real_time_data.get('Timestamp', timestamp)
+    except requests.exceptions.RequestException as e:
+        info_print(f"Error retrieving real-time data from Fastly API: {e}")
+        return None
+
+def filter_new_samples(stats_data, seen_timestamps):
+    new_samples = []
+    for data_point in stats_data:
+        recorded = data_point.get('recorded')
+        if recorded in seen_timestamps:
+            continue
+        if recorded is not None:
+            seen_timestamps.add(recorded)
+        new_samples.append(data_point)
+
+    # Only keep a window of recent sample timestamps so long streams don't grow the set forever
+    if len(seen_timestamps) > SEEN_SAMPLES_WINDOW:
+        horizon = max(seen_timestamps) - SEEN_SAMPLES_WINDOW
+        seen_timestamps.difference_update([ts for ts in seen_timestamps if ts <= horizon])
+    return new_samples
+
+def summarize_samples(samples):
+    interval_stats = {field: 0 for field in COMMON_FIELDS}
+    for data_point in samples:
+        for common_field in COMMON_FIELDS:
+            if common_field in data_point['aggregated']:
+                interval_stats[common_field] += data_point['aggregated'][common_field]
+    return interval_stats
+
+def merge_polls(older, newer):
+    # Polls the aggregation stage has not reached yet are combined, so every sample still counts towards the totals
+    return {'tick': newer['tick'], 'intervals': older['intervals'] + newer['intervals'], 'samples': older['samples'] + newer['samples']}
+
+def start_slack_publisher(slack_token, slack_channel, thread_ts, blocks):
+    # Without a message to update the stream falls back to console output
+    posted = post_message(slack_token, slack_channel, thread_ts, blocks)
+    if not posted:
+        return None
+    channel, slack_ts = posted
+    return SlackMessagePublisher(get_slack_client(slack_token), channel, slack_ts)
+
+def stream_real_time_data(api_token, service_name, environment, service_id, duration, wait_interval=DEFAULT_WAIT_INTERVAL, slack_channel=None, thread_ts=None, slack_token=None, header_fields=()):
+    info_print(f"Streaming real-time data for {duration} seconds with a wait interval of {wait_interval} seconds...")
+    total_stats = {field: 0 for field in COMMON_FIELDS}
+    seen_timestamps = set()
+    total_latency = LatencyHistogram()
+    # Written only by the aggregation and Slack stages, read once the pipeline has been closed
+    latency = {}
+    previous_stats = {field: 0 for field in COMMON_FIELDS}
+
+    publisher = None
+    if slack_channel:
+        renderer = RealtimeSlackRenderer(service_name, environment, service_id, header_fields=header_fields)
+        publisher = start_slack_publisher(slack_token, slack_channel, thread_ts, renderer.blocks)
+
+    def aggregate(poll):
+        nonlocal latency
+        new_samples = filter_new_samples(poll['samples'], seen_timestamps)
+        with span("aggregation"):
+            interval_stats = summarize_samples(new_samples)
+            for field in COMMON_FIELDS:
+                total_stats[field] += interval_stats[field]
+            interval_latency = histogram_from_samples(new_samples)
+            total_latency.merge(interval_latency)
+            latency = {'interval': interval_latency.percentiles(), 'total': total_latency.percentiles()}
+        return {'tick': poll['tick'], 'interval_seconds': poll['intervals'] * wait_interval, 'samples': len(new_samples), 'stats': interval_stats, 'totals': dict(total_stats), 'latency': latency}
+
+    def ndjson_sink(frame):
+        emit_record("interval", service=service_name, service_id=service_id, environment=environment, interval_seconds=frame['interval_seconds'], lateness_ms=round(frame['tick'].lateness * 1000, 1), samples=frame['samples'], stats=frame['stats'], totals=frame['totals'], latency_ms=frame['latency']['interval'])
+
+    def console_sink(frame):
+        info_print(f"\nReal-Time Data Summary (Last {frame['interval_seconds']} seconds):")
+        for field, value in frame['stats'].items():
+            info_print(f"{field}: {format_value(value)}")
+        info_print(f"miss latency: {format_latency(frame['latency']['interval'])}")
+        info_print("\n---\n")
+
+    def slack_sink(frame):
+        nonlocal previous_stats
+        blocks = renderer.render(frame['stats'], previous_stats, frame['latency'])
+        publisher.update(blocks, content_hash=renderer.content_hash)
+        previous_stats = frame['stats'].copy()
+
+    # Console and NDJSON keep every frame unless they fall far behind; Slack only ever needs the newest one
+    sinks = []
+    if ndjson_enabled():
+        sinks.append(("ndjson", ndjson_sink, SINK_QUEUE_SIZE, None))
+    if publisher:
+        sinks.append(("slack", slack_sink, 1, latest))
+    elif not ndjson_enabled():
+        sinks.append(("console", console_sink, SINK_QUEUE_SIZE, None))
+    pipeline = StreamPipeline(aggregate, merge_polls, sinks)
+
+    scheduler = TickScheduler(wait_interval, duration)
+    cursor = 0
+    failed_polls = 0
+    failed_intervals = 0
+    try:
+        for tick in scheduler:
+            debug_print(f"Tick {tick.index} fired {tick.lateness * 1000:.1f} ms late, covering {tick.intervals * wait_interval} seconds")
+            result = get_real_time_data(api_token, service_id, cursor)
+            if result is None:
+                # The cursor is kept, so the next successful poll picks up the samples this one missed
+                failed_polls += 1
+                failed_intervals += tick.intervals
+                info_print(f"Unable to retrieve real-time data, retrying on the next interval ({failed_polls} failed so far).")
+                continue
+            stats_data, cursor = result
+            debug_print(f"Received {len(stats_data)} samples, next cursor: {cursor}")
+            pipeline.submit({'tick': tick, 'intervals': tick.intervals + failed_intervals, 'samples': stats_data})
+            failed_intervals = 0
+
+        pipeline.close()
+        debug_print(f"Pipeline backlog handling: {pipeline.stats()}")
+        if ndjson_enabled():
+            emit_record("total", service=service_name, service_id=service_id, environment=environment, duration_seconds=duration, ticks=scheduler.ticks, missed_ticks=scheduler.missed, max_lateness_ms=round(scheduler.max_lateness * 1000, 1), stats=total_stats, latency_ms=total_latency.percentiles())
+        elif not publisher:
+            info_print("\nTotal Real-Time Data Summary:")
+            for field, value in total_stats.items():
+                info_print(f"{field}: {format_value(value)}")
+            info_print(f"miss latency: {format_latency(total_latency.percentiles())}")
+            info_print(f"ticks: {scheduler.ticks} ({scheduler.missed} missed and merged), max lateness {scheduler.max_lateness * 1000:.0f} ms")
+            info_print("\n---\n")
+    finally:
+        pipeline.close()
+        if publisher:
+            final_blocks = generate_final_slack_blocks_with_intervals(total_stats, previous_stats, service_name, environment, service_id, latency=latency, header_fields=header_fields)
+            publisher.update(final_blocks)
+            publisher.close()
+            debug_print(f"Slack updates skipped as unchanged: {publisher.skipped}, coalesced: {publisher.coalesced}")
+
+def poll_stream_state(api_token, state):
+    # Runs on the poller; only the cursor is touched here, everything else belongs to the aggregation stage
+    result = get_real_time_data(api_token, state['service_id'], state['cursor'])
+    if result is None:
+        return None
+    stats_data, state['cursor'] = result
+    debug_print(f"[{state['service_name']}] Received {len(stats_data)} samples, next cursor: {state['cursor']}")
+    return stats_data
+
+def aggregate_stream_state(state, stats_data):
+    if stats_data is None:
+        state['error'] = True
+        state['interval_stats'] = {}
+        state['interval_latency'] = {}
+        return
+    new_samples = filter_new_samples(stats_data, state['seen_timestamps'])
+    state['error'] = False
+    with span("aggregation"):
+        state['interval_stats'] = summarize_samples(new_samples)
+        for field in COMMON_FIELDS:
+            state['total_stats'][field] += state['interval_stats'][field]
+        interval_latency = histogram_from_samples(new_samples)
+        state['total_latency'].merge(interval_latency)
+        state['interval_latency'] = interval_latency.percentiles()
+
+def snapshot_stream_state(state):
+    # Sinks run on their own threads, so they are handed copies the aggregation stage will not modify
+    total_latency = LatencyHistogram()
+    total_latency.merge(state['total_latency'])
+    return {
+        'service_name': state['service_name'],
+        'service_id': state['service_id'],
+        'interval_stats': state['interval_stats'],
+        'total_stats': dict(state['total_stats']),
+        'interval_latency': state['interval_latency'],
+        'total_latency': total_latency,
+        'error': state['error']
+    }
+
+def merge_multi_polls(older, newer):
+    results = []
+    for older_data, newer_data in zip(older['results'], newer['results']):
+        # A failed poll leaves the cursor where it was, so the next successful one carries its samples
+        results.append(newer_data if older_data is None else older_data + (newer_data or []))
+    return {'tick': newer['tick'], 'intervals': older['intervals'] + newer['intervals'], 'results': results}
+
+def stream_multi_real_time_data(api_token, matched_services, environment, duration, wait_interval=DEFAULT_WAIT_INTERVAL, slack_channel=None, thread_ts=None, slack_token=None, header_fields=()):
+    info_print(f"Streaming real-time data for {len(matched_services)} services for {duration} seconds with a wait interval of {wait_interval} seconds...")
+    # Each service keeps its own cursor and totals; one request per service is in flight per tick
+    stream_states = [
+        {
+            'service_name': service_name,
+            'service_id': service_id,
+            'cursor': 0,
+            'seen_timestamps': set(),
+            'interval_stats': {},
+            'total_stats': {field: 0 for field in COMMON_FIELDS},
+            'interval_latency': {},
+            'total_latency': LatencyHistogram(),
+            'error': False
+        }
+        for service_name, service_id in matched_services
+    ]
+
+    publisher = None
+    if slack_channel:
+        blocks = generate_multi_service_slack_blocks(stream_states, environment, header_fields=header_fields)
+        publisher = start_slack_publisher(slack_token, slack_channel, thread_ts, blocks)
+
+    def aggregate(poll):
+        for state, stats_data in zip(stream_states, poll['results']):
+            aggregate_stream_state(state, stats_data)
+        return {'tick': poll['tick'], 'interval_seconds': poll['intervals'] * wait_interval, 'services': [snapshot_stream_state(state) for state in stream_states]}
+
+    def ndjson_sink(frame):
+        for state in frame['services']:
+            emit_record("interval", service=state['service_name'], service_id=state['service_id'], environment=environment, interval_seconds=frame['interval_seconds'], lateness_ms=round(frame['tick'].lateness * 1000, 1), error=state['error'], stats=state['interval_stats'], totals=state['total_stats'], latency_ms=state['interval_latency'])
+
+    def console_sink(frame):
+        info_print(f"\nReal-Time Data Summary (Last {frame['interval_seconds']} seconds):")
+        for state in frame['services']:
+            info_print(f"[{state['service_name']}]")
+            if state['error']:
+                info_print("  Unable to retrieve real-time data.")
+                continue
+            for field, value in state['interval_stats'].items():
+                info_print(f"  {field}: {format_value(value)}")
+            info_print(f"  miss latency: {format_latency(state['interval_latency'])}")
+        info_print("\n---\n")
+
+    def slack_sink(frame):
+        publisher.update(generate_multi_service_slack_blocks(frame['services'], environment, header_fields=header_fields))
+
+    sinks = []
+    if ndjson_enabled():
+        sinks.append(("ndjson", ndjson_sink, SINK_QUEUE_SIZE, None))
+    if publisher:
+        sinks.append(("slack", slack_sink, 1, latest))
+    elif not ndjson_enabled():
+        sinks.append(("console", console_sink, SINK_QUEUE_SIZE, None))
+    pipeline = StreamPipeline(aggregate, merge_multi_polls, sinks)
+
+    scheduler = TickScheduler(wait_interval, duration)
+    try:
+        with ThreadPoolExecutor(max_workers=len(stream_states)) as executor:
+            for tick in scheduler:
+                debug_print(f"Tick {tick.index} fired {tick.lateness * 1000:.1f} ms late, covering {tick.intervals * wait_interval} seconds")
+                results = list(executor.map(in_output_context(lambda state: poll_stream_state(api_token, state)), stream_states))
+                pipeline.submit({'tick': tick, 'intervals': tick.intervals, 'results': results})
+
+        pipeline.close()
+        debug_print(f"Pipeline backlog handling: {pipeline.stats()}")
+        if ndjson_enabled():
+            for state in stream_states:
+                emit_record("total", service=state['service_name'], service_id=state['service_id'], environment=environment, duration_seconds=duration, ticks=scheduler.ticks, missed_ticks=scheduler.missed, max_lateness_ms=round(scheduler.max_lateness * 1000, 1), stats=state['total_stats'], latency_ms=state['total_latency'].percentiles())
+        elif not publisher:
+            info_print("\nTotal Real-Time Data Summary:")
+            for state in stream_states:
+                info_print(f"[{state['service_name']}]")
+                for field, value in state['total_stats'].items():
+                    info_print(f"  {field}: {format_value(value)}")
+                info_print(f"  miss latency: {format_latency(state['total_latency'].percentiles())}")
+            info_print(f"ticks: {scheduler.ticks} ({scheduler.missed} missed and merged), max lateness {scheduler.max_lateness * 1000:.0f} ms")
+            info_print("\n---\n")
+    finally:
+        pipeline.close()
+        if publisher:
+            final_blocks = generate_multi_service_slack_blocks(stream_states, environment, is_final=True, header_fields=header_fields)
+            publisher.update(final_blocks)
+            publisher.close()
@@ -0,0 +1,133 @@
+import os
+import time
+import random
+import threading
+from urllib.parse import urlsplit
+import requests
+from fastly_common.utils import debug_print
+from fastly_common.timing import span
+
+HTTP_RETRIES = int(os.getenv("FASTLY_HTTP_RETRIES", "3"))
+HTTP_BACKOFF_BASE = float(os.getenv("FASTLY_HTTP_BACKOFF_BASE", "0.5"))  # Seconds before the first retry, doubled per attempt
+HTTP_BACKOFF_MAX = float(os.getenv("FASTLY_HTTP_BACKOFF_MAX", "30"))
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+RATE_LIMIT_LOW_WATER = int(os.getenv("FASTLY_RATE_LIMIT_LOW_WATER", "10"))  # Remaining requests below which calls are spread out
+RATE_LIMIT_MAX_WAIT = float(os.getenv("FASTLY_RATE_LIMIT_MAX_WAIT", "60"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("FASTLY_CIRCUIT_FAILURE_THRESHOLD", "5"))  # Consecutive failures that open the circuit
+CIRCUIT_COOLDOWN = float(os.getenv("FASTLY_CIRCUIT_COOLDOWN", "30"))
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    pass
+
+def backoff_delay(attempt, base=HTTP_BACKOFF_BASE, cap=HTTP_BACKOFF_MAX):
+    # Full jitter keeps concurrent workers that failed together from retrying together
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+def header_float(headers, name):
+    try:
+        return float(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+# Rate-limit pacing and circuit breaker state for one API host, shared by every thread talking to it
+class HostState:
+    def __init__(self, host, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, cooldown=CIRCUIT_COOLDOWN):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.next_request_at = 0.0
+
+    def before_request(self):
+        with self.lock:
+            if self.opened_at is not None:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    raise CircuitOpenError(f"Circuit open for {self.host} after {self.failures} consecutive failures")
+                # Cooldown elapsed: let requests through again, the next failure reopens the circuit at once
+                self.opened_at = None
+                self.failures = self.failure_threshold - 1
+            wait = min(self.next_request_at - time.monotonic(), RATE_LIMIT_MAX_WAIT)
+        if wait > 0:
+            debug_print(f"Pacing {self.host} for {wait:.2f}s to stay within the rate limit")
+            time.sleep(wait)
+
+    def record_rate_limit(self, headers):
+        remaining = header_float(headers, "Fastly-RateLimit-Remaining")
+        reset = header_float(headers, "Fastly-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        # Reset is a Unix timestamp; spread what is left of the window over the time until it rolls over
+        until_reset = max(reset - time.time(), 0)
+        if remaining <= 0:
+            delay = until_reset
+        elif remaining < RATE_LIMIT_LOW_WATER:
+            delay = until_reset / remaining
+        else:
+            return
+        with self.lock:
+            self.next_request_at = max(self.next_request_at, time.monotonic() + delay)
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold and self.opened_at is None:
+                self.opened_at = time.monotonic()
+                debug_print(f"Opening circuit for {self.host} after {self.failures} consecutive failures")
+
+    def retry_delay(self, response, attempt):
+        if response.status_code == 429:
+            reset = header_float(response.headers, "Fastly-RateLimit-Reset")
+            if reset is not None:
+                return min(max(reset - time.time(), 0), RATE_LIMIT_MAX_WAIT)
+            retry_after = header_float(response.headers, "Retry-After")
+            if retry_after is not None:
+                return min(retry_after, RATE_LIMIT_MAX_WAIT)
+        return backoff_delay(attempt)
+
+_host_states = {}
+_host_states_lock = threading.Lock()
+
+def get_host_state(url):
+    host = urlsplit(url).netloc
+    with _host_states_lock:
+        state = _host_states.get(host)
+        if state is None:
+            state = HostState(host)
+            _host_states[host] = state
+        return state
+
+def get_with_retry(session, url, retries=HTTP_RETRIES, **kwargs):
+    state = get_host_state(url)
+    for attempt in range(retries + 1):
+        state.before_request()
+        try:
+            with span("http_request", host=state.host):
+                response = session.get(url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            state.record_failure()
+            if attempt == retries:
+                raise
+            delay = backoff_delay(attempt)
+            debug_print(f"Retrying {url} in {delay:.2f}s after error: {e}")
+        else:
+            state.record_rate_limit(response.headers)
+            if response.status_code not in RETRY_STATUS_CODES:
+                state.record_success()
+                return response
+            # Being rate limited says nothing about the host's health, so only server errors count towards the breaker
+            if response.status_code != 429:
+                state.record_failure()
+            if attempt == retries:
+                return response
+            delay = state.retry_delay(response, attempt)
+            debug_print(f"Retrying {url} in {delay:.2f}s after HTTP {response.status_code}")
+            # A streamed response holds its connection until closed; hand it back to the pool before waiting
+            response.close()
+        time.sleep(delay)
@@ -0,0 +1,52 @@
+import math
+import time
+
+class Tick:
+    def __init__(self, index, lateness, intervals):
+        self.index = index
+        self.lateness = lateness  # Seconds between the scheduled deadline and when the tick actually fired
+        self.intervals = intervals  # More than 1 when missed ticks were merged into this one, a fraction for a short last tick
+
+# Fires ticks on fixed monotonic deadlines (start + n * interval), so time spent handling a tick
+# never pushes the following ones back. Deadlines that already passed are merged into the next tick,
+# and a last tick always fires at the end of the stream, covering whatever part of an interval is left.
+class TickScheduler:
+    def __init__(self, interval, duration, clock=time.monotonic, sleep=time.sleep):
+        if interval <= 0:
+            raise ValueError(f"Tick interval must be positive, got {interval}")
+        self.interval = interval
+        self.duration = duration
+        self.clock = clock
+        self.sleep = sleep
+        self.start = clock()
+        self.end = self.start + duration
+        self.ticks = 0
+        self.missed = 0
+        self.max_lateness = 0.0
+
+    def __iter__(self):
+        # Positions are counted in intervals since the start; the stream ends at position total, which may be fractional
+        total = self.duration / self.interval
+        if abs(total - round(total)) < 1e-9:
+            total = round(total)
+        covered = 0
+        while covered < total:
+            target = min(math.floor(covered) + 1, total)
+            deadline = self.start + target * self.interval
+            now = self.clock()
+            if now < deadline:
+                self.sleep(deadline - now)
+                now = self.clock()
+
+            # Whole intervals already behind are folded into this tick rather than fired back to back;
+            # once the end has passed the tick simply covers the rest of the stream
+            position = (now - self.start) / self.interval
+            reached = total if position >= total else max(target, math.floor(position))
+            lateness = max(now - (self.start + reached * self.interval), 0.0)
+            intervals = reached - covered
+            covered = reached
+
+            self.ticks += 1
+            self.missed += math.ceil(reached - target)
+            self.max_lateness = max(self.max_lateness, lateness)
+            yield Tick(self.ticks, lateness, intervals)
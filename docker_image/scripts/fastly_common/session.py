@@ -0,0 +1,50 @@
+import os
+import threading
+
+# Overridable so the scripts can be pointed at a local stand-in such as benchmarks/mock_fastly.py
+HISTORICAL_BASE_URL = os.getenv("FASTLY_API_BASE_URL", "https://api.fastly.com")
+REAL_TIME_BASE_URL = os.getenv("FASTLY_RT_BASE_URL", "https://rt.fastly.com")
+HTTP_POOL_SIZE = int(os.getenv("FASTLY_HTTP_POOL_SIZE", "10"))  # Connections kept alive per host
+HTTP_CONNECT_TIMEOUT = float(os.getenv("FASTLY_HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("FASTLY_HTTP_READ_TIMEOUT", "30"))
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def create_session(api_token, pool_size=HTTP_POOL_SIZE):
+    # Imported on first use so commands that never reach Fastly do not pay for requests
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.request import ACCEPT_ENCODING
+
+    session = requests.Session()
+    session.headers.update({
+        "Fastly-Key": api_token,
+        "Accept": "application/json",
+        # Every encoding urllib3 can decode here: gzip and deflate, br with brotli (in requirements.txt), zstd with zstandard
+        "Accept-Encoding": ACCEPT_ENCODING
+    })
+    # One adapter per host so api.fastly.com and rt.fastly.com each get their own keep-alive pool
+    for base_url in (HISTORICAL_BASE_URL, REAL_TIME_BASE_URL):
+        session.mount(base_url, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+    return session
+
+def get_session(api_token):
+    with _sessions_lock:
+        session = _sessions.get(api_token)
+        if session is None:
+            session = create_session(api_token)
+            _sessions[api_token] = session
+        return session
+
+def fastly_get(api_token, url, **kwargs):
+    # Every Fastly call shares the per-host backoff, rate-limit pacing and circuit breaker
+    from fastly_common.retry import get_with_retry
+    kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    return get_with_retry(get_session(api_token), url, **kwargs)
+
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
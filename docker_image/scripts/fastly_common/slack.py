@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from fastly_common.utils import debug_print
+from fastly_common.output import info_print, capture_output_context, restore_output_context
+from fastly_common.timing import span
+
+SLACK_MAX_UPDATES_PER_SECOND = float(os.getenv("SLACK_MAX_UPDATES_PER_SECOND", "1"))
+SLACK_FLUSH_TIMEOUT = 30  # Seconds the final update may wait on rate limiting before it is given up
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_slack_client(token):
+    # slack_sdk is only imported once a Slack channel is actually in use
+    from slack_sdk import WebClient
+
+    with _clients_lock:
+        client = _clients.get(token)
+        if client is None:
+            client = WebClient(token=token)
+            _clients[token] = client
+        return client
+
+@span("slack_post")
+def post_message(token, channel, thread_ts, blocks, text="Message from script"):
+    from slack_sdk.errors import SlackApiError
+    client = get_slack_client(token)
+    try:
+        response = client.chat_postMessage(channel=channel, thread_ts=thread_ts, blocks=blocks, text=text)
+        return response["channel"], response["ts"]
+    except SlackApiError as e:
+        info_print(f"Error sending message to Slack: {e.response['error']}")
+        return None
+
+def blocks_hash(blocks, text=None):
+    return hashlib.sha1(json.dumps([blocks, text], sort_keys=True).encode()).hexdigest()
+
+def retry_after_seconds(error):
+    try:
+        return float(error.response.headers.get("Retry-After", 1))
+    except (AttributeError, TypeError, ValueError):
+        return 1.0
+
+# Keeps one Slack message up to date from a background thread, so callers never wait on Slack
+class SlackMessagePublisher:
+    def __init__(self, client, channel, ts, max_updates_per_second=SLACK_MAX_UPDATES_PER_SECOND):
+        self.client = client
+        self.channel = channel
+        self.ts = ts
+        self.min_interval = 1.0 / max_updates_per_second if max_updates_per_second > 0 else 0
+        self.condition = threading.Condition()
+        self.pending = None
+        self.pending_hash = None
+        self.sent_hash = None
+        self.next_send_at = 0
+        self.sending = False
+        self.closed = False
+        self.skipped = 0
+        self.coalesced = 0
+        self.output_context = capture_output_context()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def update(self, blocks, text="Updated message from script", content_hash=None):
+        content_hash = content_hash or blocks_hash(blocks, text)
+        with self.condition:
+            if content_hash == (self.pending_hash if self.pending else self.sent_hash):
+                self.skipped += 1
+                return False
+            # A newer frame simply replaces one that has not been sent yet
+            if self.pending:
+                self.coalesced += 1
+            self.pending = (blocks, text)
+            self.pending_hash = content_hash
+            self.condition.notify()
+            return True
+
+    def flush(self, timeout=SLACK_FLUSH_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while (self.pending or self.sending) and time.monotonic() < deadline:
+                self.condition.wait(deadline - time.monotonic())
+            return not self.pending
+
+    def close(self, timeout=SLACK_FLUSH_TIMEOUT):
+        flushed = self.flush(timeout)
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        return flushed
+
+    def _run(self):
+        from slack_sdk.errors import SlackApiError
+
+        restore_output_context(self.output_context)
+        while True:
+            with self.condition:
+                while not self.closed and (not self.pending or time.monotonic() < self.next_send_at):
+                    self.condition.wait(max(self.next_send_at - time.monotonic(), 0) if self.pending else None)
+                if self.closed:
+                    return
+                blocks, text = self.pending
+                content_hash = self.pending_hash
+                self.pending = None
+                self.sending = True
+
+            next_send_at = time.monotonic() + self.min_interval
+            sent = False
+            rate_limited = False
+            try:
+                with span("slack_post"):
+                    self.client.chat_update(channel=self.channel, ts=self.ts, blocks=blocks, text=text)
+                sent = True
+            except SlackApiError as e:
+                if e.response.status_code == 429:
+                    rate_limited = True
+                    next_send_at = time.monotonic() + retry_after_seconds(e)
+                    debug_print(f"Slack rate limited the update, retrying in {next_send_at - time.monotonic():.1f}s")
+                else:
+                    info_print(f"Error updating message on Slack: {e.response['error']}")
+
+            with self.condition:
+                self.sending = False
+                self.next_send_at = next_send_at
+                if sent:
+                    self.sent_hash = content_hash
+                elif rate_limited and self.pending is None:
+                    # Rate limited: put the frame back unless something newer already replaced it
+                    self.pending = (blocks, text)
+                    self.pending_hash = content_hash
+                self.condition.notify_all()
@@ -0,0 +1,42 @@
+import os
+import sys
+import time
+import atexit
+import builtins
+
+STARTUP_TIMING = os.getenv("FASTLY_STARTUP_TIMING", "").lower() in ("1", "true", "yes")
+# Dependencies worth reporting on; each time includes everything the import pulled in
+TIMED_DEPENDENCIES = (
+    "requests", "fuzzywuzzy", "numpy", "sqlalchemy", "slack_sdk", "pprint",
+    "socketserver", "fastly_common",
+)
+
+_started = time.perf_counter()
+_original_import = builtins.__import__
+import_timings = {}
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    top_level = name.partition(".")[0]
+    # Submodules are only reported for our own package; a dependency's internals count towards the dependency
+    reported = name == top_level or top_level == "fastly_common"
+    if level or not reported or top_level not in TIMED_DEPENDENCIES or name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        import_timings[name] = time.perf_counter() - start
+
+def print_startup_report():
+    total = time.perf_counter() - _started
+    lines = ["Startup timing (first import of each dependency):"]
+    for name, elapsed in sorted(import_timings.items(), key=lambda item: item[1], reverse=True):
+        lines.append(f"  {name:<32} {elapsed * 1000:8.1f} ms")
+    lines.append(f"  {'total run time':<32} {total * 1000:8.1f} ms")
+    print("\n".join(lines), file=sys.stderr)
+
+def enable_import_timing():
+    if not STARTUP_TIMING or builtins.__import__ is _timed_import:
+        return
+    builtins.__import__ = _timed_import
+    atexit.register(print_startup_report)
@@ -0,0 +1,132 @@
+import os
+import json
+import time
+from sqlalchemy import create_engine, MetaData, Table, Column, String, Integer, Text, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import SQLAlchemyError
+from fastly_common.historical import stream_historical_range, BUCKET_SECONDS
+from fastly_common.utils import debug_print
+from fastly_common.output import info_print
+from fastly_common.jsoncodec import loads
+
+STATS_DB_FILE = os.getenv("FASTLY_STATS_DB", "fastly_stats.db")  # Set to an empty string to disable the local store
+STATS_SETTLE_SECONDS = int(os.getenv("FASTLY_STATS_SETTLE_SECONDS", "900"))  # Buckets newer than this may still change
+SAVE_BATCH_SIZE = 500
+
+metadata = MetaData()
+stats_buckets = Table(
+    "stats_buckets",
+    metadata,
+    Column("service_id", String, primary_key=True),
+    Column("resolution", String, primary_key=True),
+    Column("start_time", Integer, primary_key=True),
+    Column("data", Text, nullable=True)  # NULL marks a settled bucket the API returned nothing for
+)
+
+_engine = None
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        _engine = create_engine(f"sqlite:///{STATS_DB_FILE}")
+        metadata.create_all(_engine)
+    return _engine
+
+def expected_bucket_starts(start_time, end_time, by='minute'):
+    step = BUCKET_SECONDS.get(by, 60)
+    first = int(start_time) - int(start_time) % step
+    return list(range(first, int(end_time), step))
+
+def iter_stored_rows(service_id, by, start_time, end_time, batch_size=SAVE_BATCH_SIZE):
+    query = select(stats_buckets.c.start_time, stats_buckets.c.data).where(
+        stats_buckets.c.service_id == service_id,
+        stats_buckets.c.resolution == by,
+        stats_buckets.c.start_time >= start_time,
+        stats_buckets.c.start_time < end_time
+    )
+    with get_engine().connect() as conn:
+        result = conn.execute(query)
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+
+def save_buckets(service_id, by, buckets):
+    if not buckets:
+        return
+    rows = [
+        {"service_id": service_id, "resolution": by, "start_time": start_time, "data": data}
+        for start_time, data in buckets.items()
+    ]
+    with get_engine().begin() as conn:
+        # Batched so long ranges stay under SQLite's bound-parameter limit
+        for offset in range(0, len(rows), SAVE_BATCH_SIZE):
+            statement = sqlite_insert(stats_buckets).values(rows[offset:offset + SAVE_BATCH_SIZE])
+            statement = statement.on_conflict_do_update(
+                index_elements=["service_id", "resolution", "start_time"],
+                set_={"data": statement.excluded.data}
+            )
+            conn.execute(statement)
+
+def find_gaps(expected_starts, stored_starts, by='minute'):
+    step = BUCKET_SECONDS.get(by, 60)
+    gaps = []
+    for start_time in expected_starts:
+        if start_time in stored_starts:
+            continue
+        if gaps and gaps[-1][1] == start_time:
+            gaps[-1][1] = start_time + step
+        else:
+            gaps.append([start_time, start_time + step])
+    return [tuple(gap) for gap in gaps]
+
+def query_historical_range(api_token, service_id, start_time, end_time, consume, by='minute'):
+    # Rows are handed to consume in batches, stored ones first, so neither the store nor the API response is held whole
+    if not STATS_DB_FILE:
+        stream_historical_range(api_token, service_id, start_time, end_time, consume, by)
+        return
+
+    step = BUCKET_SECONDS.get(by, 60)
+    expected_starts = expected_bucket_starts(start_time, end_time, by)
+    if not expected_starts:
+        return
+    range_start = expected_starts[0]
+    stored_starts = set()
+    try:
+        for rows in iter_stored_rows(service_id, by, range_start, int(end_time)):
+            consume([loads(row.data) for row in rows if row.data is not None])
+            stored_starts.update(row.start_time for row in rows)
+    except SQLAlchemyError as e:
+        # Whatever was not read yet is fetched from the API along with the gaps
+        info_print(f"Error reading stats store {STATS_DB_FILE}: {e}")
+    gaps = find_gaps(expected_starts, stored_starts, by)
+    debug_print(f"Stats store has {len(stored_starts)}/{len(expected_starts)} buckets, fetching {len(gaps)} gaps")
+
+    settled_before = time.time() - STATS_SETTLE_SECONDS
+    store_failed = False
+
+    def save_settled(buckets):
+        nonlocal store_failed
+        # Only buckets that have fully settled are persisted; the recent tail is refetched every time
+        settled = {start_time: json.dumps(bucket) if bucket is not None else None for start_time, bucket in buckets.items() if start_time + step <= settled_before}
+        if store_failed or not settled:
+            return
+        try:
+            save_buckets(service_id, by, settled)
+        except SQLAlchemyError as e:
+            info_print(f"Error saving to stats store {STATS_DB_FILE}: {e}")
+            store_failed = True
+
+    for gap_start, gap_end in gaps:
+        returned = set()
+
+        def save_and_consume(batch, gap_start=gap_start, gap_end=gap_end, returned=returned):
+            batch = [bucket for bucket in batch if gap_start <= bucket['start_time'] < gap_end]
+            returned.update(bucket['start_time'] for bucket in batch)
+            save_settled({bucket['start_time']: bucket for bucket in batch})
+            consume(batch)
+
+        stream_historical_range(api_token, service_id, gap_start, gap_end, save_and_consume, by)
+        # Settled buckets the API returned nothing for are stored empty, so they are not asked for again
+        save_settled({start_time: None for start_time in range(gap_start, gap_end, step) if start_time not in returned})
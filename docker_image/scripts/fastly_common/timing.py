@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import time
+import atexit
+import tempfile
+import threading
+from contextlib import contextmanager
+
+TIMING_LOG = os.getenv("FASTLY_TIMING_LOG")  # JSON lines file each span is appended to, "-" for stderr
+METRICS_FILE = os.getenv("FASTLY_METRICS_FILE")  # Prometheus text-format file rewritten on exit
+METRICS_PORT = int(os.getenv("FASTLY_METRICS_PORT", "0"))  # Serves /metrics when set, useful in daemon mode
+METRIC_NAME = "fastly_query_phase_seconds"
+# Histogram bucket upper bounds in seconds
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_phases = {}
+_log_file = None
+_metrics_server = None
+_exit_registered = False
+
+def timing_enabled():
+    return bool(TIMING_LOG or METRICS_FILE or METRICS_PORT)
+
+def record_span(phase, duration, labels):
+    global _log_file
+    with _lock:
+        stats = _phases.get(phase)
+        if stats is None:
+            stats = {'count': 0, 'sum': 0.0, 'buckets': [0] * len(DURATION_BUCKETS)}
+            _phases[phase] = stats
+        stats['count'] += 1
+        stats['sum'] += duration
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if duration <= bound:
+                stats['buckets'][index] += 1
+                break
+        if TIMING_LOG:
+            if _log_file is None:
+                _log_file = sys.stderr if TIMING_LOG == "-" else open(TIMING_LOG, "a")
+            record = {"type": "span", "timestamp": time.time(), "phase": phase, "duration_ms": round(duration * 1000, 3)}
+            record.update(labels)
+            _log_file.write(json.dumps(record, separators=(',', ':')) + "\n")
+            _log_file.flush()
+
+@contextmanager
+def span(phase, **labels):
+    if not timing_enabled():
+        yield
+        return
+    start_timing()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(phase, time.perf_counter() - start, labels)
+
+def render_prometheus():
+    lines = [
+        f"# HELP {METRIC_NAME} Time spent in each phase of a query.",
+        f"# TYPE {METRIC_NAME} histogram",
+    ]
+    with _lock:
+        for phase, stats in sorted(_phases.items()):
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS, stats['buckets']):
+                cumulative += count
+                lines.append(f'{METRIC_NAME}_bucket{{phase="{phase}",le="{bound}"}} {cumulative}')
+            lines.append(f'{METRIC_NAME}_bucket{{phase="{phase}",le="+Inf"}} {stats["count"]}')
+            lines.append(f'{METRIC_NAME}_sum{{phase="{phase}"}} {stats["sum"]:.6f}')
+            lines.append(f'{METRIC_NAME}_count{{phase="{phase}"}} {stats["count"]}')
+    return "\n".join(lines) + "\n"
+
+def write_metrics_file(path=METRICS_FILE):
+    # Written with a rename so a node_exporter textfile collector never reads a partial file
+    metrics_dir = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=metrics_dir, prefix=f".{os.path.basename(path)}.")
+    with os.fdopen(fd, 'w') as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+def start_metrics_server(port=METRICS_PORT):
+    global _metrics_server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    _metrics_server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+
+def finish_timing():
+    if METRICS_FILE:
+        try:
+            write_metrics_file(METRICS_FILE)
+        except OSError as e:
+            print(f"Error writing metrics to {METRICS_FILE}: {e}", file=sys.stderr)
+
+def start_timing():
+    global _exit_registered
+    with _lock:
+        if _exit_registered:
+            return
+        _exit_registered = True
+    atexit.register(finish_timing)
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
@@ -0,0 +1,6 @@
+import os
+from fastly_common.output import info_print
+
+def debug_print(message):
+    if os.getenv("KUBIYA_DEBUG"):
+        info_print(message)
@@ -7,6 +7,7 @@ from datetime import datetime, timedelta
 from fuzzywuzzy import process, fuzz
 from pprint import pprint
 import time
+from fastly_common.session import fastly_get, REAL_TIME_BASE_URL, HISTORICAL_BASE_URL
 
 VALID_ENVIRONMENTS = ['production', 'dev', 'qa']
 API_TOKEN = os.getenv("FASTLY_API_TOKEN")  # Replace this with your actual API token
@@ -15,8 +16,6 @@ FIELDS_CACHE_FILE = "fields_cache.json"
 CACHE_EXPIRY_HOURS = 24
 TIME_UNITS = ['second', 'seconds', 'minute', 'minutes', 'hour', 'hours', 'day', 'days', 'week', 'weeks', 'month', 'months']
 FUZZY_MATCH_THRESHOLD = 80  # Adjust this threshold based on how strict you want the matching to be
-REAL_TIME_BASE_URL = "https://rt.fastly.com"
-HISTORICAL_BASE_URL = "https://api.fastly.com"
 DEFAULT_STREAM_DURATION = 6  # Default streaming duration in seconds
 DEFAULT_WAIT_INTERVAL = 2  # Default wait interval for real-time streaming
 FASTLY_DASHBOARD_HISTORICAL_URL = "https://manage.fastly.com/observability/dashboard/system/overview/historic/{service_id}?range={range}&region=all"
@@ -58,10 +57,6 @@ def list_services():
         return cached_services
 
     url = f"{HISTORICAL_BASE_URL}/service"
-    headers = {
-        "Fastly-Key": API_TOKEN,
-        "Accept": "application/json"
-    }
     params = {
         "direction": "ascend",
         "page": 1,
@@ -73,7 +68,7 @@ def list_services():
     
     try:
         while True:
-            response = requests.get(url, headers=headers, params=params)
+            response = fastly_get(API_TOKEN, url, params=params)
             response.raise_for_status()
             services = response.json()
             if not services:
@@ -107,14 +102,10 @@ def get_historical_data(api_token, service_id, start_time=None, end_time=None, b
     else:
         url = f"{base_url}?from={int(start_time)}&to={int(end_time)}&by={by}&region=global"
     debug_print(f"API URL: {url}")
-    headers = {
-        "Fastly-Key": api_token,
-        "Accept": "application/json"
-    }
-    
+
     try:
         debug_print(f"Retrieving data from {start_time} to {end_time}...")
-        response = requests.get(url, headers=headers)
+        response = fastly_get(api_token, url)
         response.raise_for_status()
         stats_data = response.json()
         return stats_data['data']
@@ -125,14 +116,10 @@ def get_historical_data(api_token, service_id, start_time=None, end_time=None, b
 def get_real_time_data(api_token, service_id, duration_seconds=5):
     url = f"{REAL_TIME_BASE_URL}/v1/channel/{service_id}/ts/h?limit={duration_seconds}"
     debug_print(f"Real-Time API URL: {url}")
-    headers = {
-        "Fastly-Key": api_token,
-        "Accept": "application/json"
-    }
-    
+
     try:
         debug_print("Retrieving real-time data...")
-        response = requests.get(url, headers=headers)
+        response = fastly_get(api_token, url)
         response.raise_for_status()
         real_time_data = response.json()
         return real_time_data['Data']
@@ -1,14 +1,20 @@
 #!/usr/bin/env python3
 import sys
-import requests
+from fastly_common import startup
+startup.enable_import_timing()  # No-op unless FASTLY_STARTUP_TIMING is set
 import os
-import json
 from datetime import datetime, timedelta
-from fuzzywuzzy import process, fuzz
-from pprint import pprint
-import time
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
+import threading
+from collections import OrderedDict
+from fastly_common.cache import load_cache, save_cache, read_cache_entry, load_or_refresh_cache, refresh_cache
+from fastly_common.catalog import fetch_services, build_service_index, catalog_fingerprint, prefix_candidates, ngram_candidates
+from fastly_common.output import ndjson_enabled, info_print, emit_record, set_output_format
+from fastly_common.fields import DEFAULT_STATS_FIELDS, COMMON_FIELDS, build_field_schema, lookup_field
+from fastly_common.slack import get_slack_client, post_message
+from fastly_common.timing import span, timing_enabled, start_timing
+from fastly_common.utils import debug_print
+from fastly_common.blocks import format_value, generate_dashboard_url, generate_slack_blocks
+from fastly_common.realtime import DEFAULT_WAIT_INTERVAL, stream_real_time_data, stream_multi_real_time_data
 
 VALID_ENVIRONMENTS = ['production', 'dev', 'qa']
 API_TOKEN = os.getenv("FASTLY_API_TOKEN")  # Replace this with your actual API token
@@ -16,82 +22,59 @@ SLACK_API_TOKEN = os.getenv("SLACK_API_TOKEN")
 SLACK_CHANNEL_ID = os.getenv("SLACK_CHANNEL_ID")
 SLACK_THREAD_TS = os.getenv("SLACK_THREAD_TS")
 CACHE_FILE = "services_cache.json"
+SERVICES_INDEX_FILE = "services_index.json"
+RESOLUTION_CACHE_FILE = "resolution_cache.json"
+RESOLUTION_CACHE_SIZE = 256  # Most recently used (environment, service) phrases kept
 FIELDS_CACHE_FILE = "fields_cache.json"
-CACHE_EXPIRY_HOURS = 24
 TIME_UNITS = ['second', 'seconds', 'minute', 'minutes', 'hour', 'hours', 'day', 'days', 'week', 'weeks', 'month', 'months']
 FUZZY_MATCH_THRESHOLD = 80  # Adjust this threshold based on how strict you want the matching to be
-REAL_TIME_BASE_URL = "https://rt.fastly.com"
-HISTORICAL_BASE_URL = "https://api.fastly.com"
 DEFAULT_STREAM_DURATION = 60  # Default streaming duration in seconds
-DEFAULT_WAIT_INTERVAL = 1  # Default wait interval for real-time streaming
-FASTLY_DASHBOARD_HISTORICAL_URL = "https://manage.fastly.com/observability/dashboard/system/overview/historic/{service_id}?range={range}&region=all"
-FASTLY_DASHBOARD_REALTIME_URL = "https://manage.fastly.com/observability/dashboard/system/overview/realtime/{service_id}?range={range}"
+SLACK_HEADER_FIELDS = []  # Extra fields shown next to the service and environment in every Slack summary
 
-COMMON_FIELDS = ["status_5xx", "requests", "hits", "miss", "all_pass_requests"]
-
-def debug_print(message):
-    if os.getenv("KUBIYA_DEBUG"):
-        print(message)
-
-def load_cache(cache_file):
-    try:
-        if os.path.exists(cache_file):
-            with open(cache_file, 'r') as f:
-                cache_data = json.load(f)
-                cache_timestamp = datetime.fromisoformat(cache_data['timestamp'])
-                if datetime.utcnow() - cache_timestamp < timedelta(hours=CACHE_EXPIRY_HOURS):
-                    return cache_data['data']
-    except Exception as e:
-        print(f"Error loading cache from {cache_file}: {e}")
-    return None
-
-def save_cache(cache_file, data):
-    try:
-        cache_data = {
-            'timestamp': datetime.utcnow().isoformat(),
-            'data': data
-        }
-        with open(cache_file, 'w') as f:
-            json.dump(cache_data, f)
-    except Exception as e:
-        print(f"Error saving cache to {cache_file}: {e}")
+# The daemon answers queries on concurrent threads, so the in-memory catalog state is only touched under this lock
+state_lock = threading.RLock()
+service_index = None
+fingerprinted_catalog = None
+# A stale catalog is refreshed by a detached "refresh_services" run of this script; the daemon clears this to use a thread
+BACKGROUND_REFRESH_COMMAND = [sys.executable, os.path.abspath(__file__), "refresh_services"]
 
 def list_services():
-    cached_services = load_cache(CACHE_FILE)
-    if cached_services:
-        debug_print("Loaded services from cache.")
-        return cached_services
-
-    url = f"{HISTORICAL_BASE_URL}/service"
-    headers = {
-        "Fastly-Key": API_TOKEN,
-        "Accept": "application/json"
-    }
-    params = {
-        "direction": "ascend",
-        "page": 1,
-        "per_page": 20,
-        "sort": "created"
-    }
-    
-    all_services = {}
-    
-    try:
-        while True:
-            response = requests.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            services = response.json()
-            if not services:
-                break
-            for service in services:
-                all_services[service['name']] = service['id']
-            params["page"] += 1
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching services from Fastly API: {e}")
-    
-    save_cache(CACHE_FILE, all_services)
+    return load_or_refresh_cache(CACHE_FILE, refresh_services, refresh_command=BACKGROUND_REFRESH_COMMAND) or {}
+
+@span("catalog_fetch")
+def refresh_services():
+    all_services = fetch_services(API_TOKEN)
+    if all_services:
+        refresh_service_index(all_services)
     return all_services
 
+def get_catalog_fingerprint(services):
+    global fingerprinted_catalog
+    # The cache layer hands back the same catalog object until the file changes, so it is hashed once per version
+    with state_lock:
+        if fingerprinted_catalog is None or fingerprinted_catalog[0] is not services:
+            fingerprinted_catalog = (services, catalog_fingerprint(services))
+        return fingerprinted_catalog[1]
+
+def refresh_service_index(services):
+    global service_index
+    index = build_service_index(list(services.keys()))
+    with state_lock:
+        service_index = index
+        save_cache(SERVICES_INDEX_FILE, index)
+    return index
+
+def get_service_index(services):
+    global service_index
+    with state_lock:
+        if service_index is None:
+            service_index = load_cache(SERVICES_INDEX_FILE)
+        # The index is rebuilt whenever it no longer describes the catalog it is asked about
+        if not service_index or service_index.get('fingerprint') != get_catalog_fingerprint(services):
+            debug_print("Rebuilding service name index.")
+            refresh_service_index(dict.fromkeys(services))
+        return service_index
+
 def construct_service_prefix(service_name, environment):
     if environment == 'production':
         return service_name
@@ -105,373 +88,296 @@ def get_environment(env_name):
         return env_name
     return None
 
-def get_historical_data(api_token, service_id, start_time=None, end_time=None, by='minute', field=None):
-    base_url = f"{HISTORICAL_BASE_URL}/stats/service/{service_id}"
-    if field:
-        url = f"{base_url}/field/{field}?from={int(start_time)}&to={int(end_time)}&by={by}&region=global"
-    else:
-        url = f"{base_url}?from={int(start_time)}&to={int(end_time)}&by={by}&region=global"
-    debug_print(f"API URL: {url}")
-    headers = {
-        "Fastly-Key": api_token,
-        "Accept": "application/json"
-    }
-    
+def get_historical_data(api_token, service_id, start_time, end_time, by, fields):
+    # requests and the SQLAlchemy store are only loaded once a command actually queries Fastly
+    import requests
+    from fastly_common.aggregate import aggregate_stored_range
+
     try:
         debug_print(f"Retrieving data from {start_time} to {end_time}...")
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        stats_data = response.json()
-        return stats_data['data']
-    except requests.exceptions.RequestException as e:
-        print(f"Error retrieving historical data from Fastly API: {e}")
+        return aggregate_stored_range(api_token, service_id, start_time, end_time, by, fields)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        info_print(f"Error retrieving historical data from Fastly API: {e}")
         return None
 
-def get_real_time_data(api_token, service_id, duration_seconds=5):
-    url = f"{REAL_TIME_BASE_URL}/v1/channel/{service_id}/ts/0"
-    debug_print(f"Real-Time API URL: {url}")
-    headers = {
-        "Fastly-Key": api_token,
-        "Accept": "application/json"
-    }
-    
+def get_historical_aggregates(api_token, service_id, start_time, end_time, by, fields):
+    import requests
+    from fastly_common.aggregate import stream_field_aggregates
+
     try:
-        debug_print("Retrieving real-time data...")
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        real_time_data = response.json()
-        return real_time_data['Data']
-    except requests.exceptions.RequestException as e:
-        print(f"Error retrieving real-time data from Fastly API: {e}")
+        debug_print(f"Streaming {fields} from {start_time} to {end_time}...")
+        return stream_field_aggregates(api_token, service_id, start_time, end_time, by, fields)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        info_print(f"Error retrieving historical data from Fastly API: {e}")
         return None
 
 def get_best_match(prefix, services):
-    results = process.extract(prefix, services, scorer=fuzz.WRatio)
-    filtered_results = [result for result in results if result[0].startswith(prefix)]
-    if not filtered_results:
-        best_match = max(results, key=lambda x: x[1])
-    else:
-        best_match = max(filtered_results, key=lambda x: x[1])
+    index = get_service_index(services)
+    exact_match = index['exact'].get(prefix.lower())
+    if exact_match:
+        return exact_match
+
+    # Fuzzy scoring only runs over the names sharing the prefix, or failing that the closest n-gram matches
+    candidates = prefix_candidates(index, prefix) or ngram_candidates(index, prefix)
+    if not candidates:
+        return None
+    from fuzzywuzzy import process, fuzz
+    best_match = process.extractOne(prefix, candidates, scorer=fuzz.WRatio)
     return best_match[0] if best_match else None
 
-def get_matching_field(field_name, stats_data):
-    fields_cache = load_cache(FIELDS_CACHE_FILE)
-    if fields_cache:
-        debug_print("Loaded fields from cache.")
-        fields = fields_cache
-    else:
-        fields = list(stats_data[0].keys()) if stats_data else []
-        save_cache(FIELDS_CACHE_FILE, fields)
-
-    processed_fields = [field.replace('_', ' ').replace('-', ' ') for field in fields]
-    best_match = process.extractOne(field_name, processed_fields, scorer=fuzz.WRatio)
-    if best_match[1] < FUZZY_MATCH_THRESHOLD:
-        print(f"Ambiguous field name '{field_name}'. Did you mean one of these?")
-        suggestions = process.extract(field_name, processed_fields, limit=5, scorer=fuzz.WRatio)
-        for suggestion, score in suggestions:
-            print(f"  - {suggestion.replace(' ', '_')}")
-        sys.exit(1)
-
-    original_fields = {field.replace(' ', '_').replace('-', '_'): field for field in fields}
-    return original_fields.get(best_match[0].replace(' ', '_').replace('-', '_')), processed_fields
-
-def format_value(value):
-    try:
-        value = float(value)  # Ensure the value is a number
-        if value >= 1000:
-            return f"{value / 1000:.1f}K ({int(value)})"
-        return str(int(value))
-    except (ValueError, TypeError):
-        return str(value)
+resolution_cache = None
+resolution_cache_fingerprint = None
+
+def normalize_service_query(service_name, environment):
+    return f"{environment}|{' '.join(service_name.lower().split())}"
+
+def load_resolution_cache(services):
+    global resolution_cache, resolution_cache_fingerprint
+    fingerprint = get_catalog_fingerprint(services)
+    # Entries resolved against any other version of the catalog may no longer be the best match
+    if resolution_cache is None or resolution_cache_fingerprint != fingerprint:
+        resolution_cache = OrderedDict()
+        resolution_cache_fingerprint = fingerprint
+        cached = load_cache(RESOLUTION_CACHE_FILE)
+        if cached and cached.get('catalog_fingerprint') == fingerprint:
+            for key, name, service_id in cached['entries']:
+                resolution_cache[key] = (name, service_id)
+    return resolution_cache
+
+def save_resolution_cache():
+    entries = [[key, name, service_id] for key, (name, service_id) in resolution_cache.items()]
+    save_cache(RESOLUTION_CACHE_FILE, {'catalog_fingerprint': resolution_cache_fingerprint, 'entries': entries})
+
+@span("name_resolution")
+def resolve_service(service_name, environment, services):
+    key = normalize_service_query(service_name, environment)
+    with state_lock:
+        cache = load_resolution_cache(services)
+        cached = cache.get(key)
+        if cached and services.get(cached[0]) == cached[1]:
+            debug_print(f"Resolved '{key}' from resolution cache.")
+            cache.move_to_end(key)
+            return cached[0]
+
+    service_prefix = construct_service_prefix(service_name, environment)
+    debug_print(f"Constructed service prefix: {service_prefix}")
+    best_match = get_best_match(service_prefix, services)
+    if best_match:
+        with state_lock:
+            cache = load_resolution_cache(services)
+            cache[key] = (best_match, services[best_match])
+            cache.move_to_end(key)
+            while len(cache) > RESOLUTION_CACHE_SIZE:
+                cache.popitem(last=False)
+            save_resolution_cache()
+    return best_match
+
+field_schema = None
+
+def get_field_schema():
+    global field_schema
+    with state_lock:
+        if field_schema is None:
+            # Fields are only ever added, so an expired cache still holds every field learned so far
+            cached_schema, _ = read_cache_entry(FIELDS_CACHE_FILE)
+            if isinstance(cached_schema, dict):
+                debug_print("Loaded field schema from cache.")
+                field_schema = cached_schema
+            else:
+                # A plain list is the field list of a real response, as cached by earlier versions of this script
+                field_schema = build_field_schema(cached_schema or DEFAULT_STATS_FIELDS, learned=bool(cached_schema))
+                save_cache(FIELDS_CACHE_FILE, field_schema)
+        return field_schema
+
+def update_field_schema(stats_data):
+    global field_schema
+    if not stats_data:
+        return
+    with state_lock:
+        schema = get_field_schema()
+        new_fields = [field for field in stats_data[0].keys() if field not in schema['neighbours']]
+        if new_fields:
+            debug_print(f"Adding {len(new_fields)} new fields to the field schema.")
+            field_schema = build_field_schema(schema['fields'] + new_fields, learned=True)
+            save_cache(FIELDS_CACHE_FILE, field_schema)
+        elif not schema.get('learned'):
+            field_schema = dict(schema, learned=True)
+            save_cache(FIELDS_CACHE_FILE, field_schema)
+
+def report_ambiguous_field(field_name, suggestions):
+    info_print(f"Ambiguous field name '{field_name}'. Did you mean one of these?")
+    for suggestion in suggestions:
+        info_print(f"  - {suggestion}")
+    sys.exit(1)
+
+def get_matching_field(field_name):
+    schema = get_field_schema()
+    matching_field, suggestions, fuzzy = lookup_field(schema, field_name, FUZZY_MATCH_THRESHOLD)
+    # Until a real response has been seen, a name that is not exactly in the seed list may be a real field the list lacks
+    if fuzzy and not schema.get('learned'):
+        return matching_field, suggestions, True
+    if not matching_field:
+        report_ambiguous_field(field_name, suggestions)
+    return matching_field, suggestions, False
+
+def learn_field_schema(service_id, start_time, by):
+    # A single full-row bucket shows every field the API currently reports
+    import requests
+    from fastly_common.historical import fetch_stats_chunk, BUCKET_SECONDS
 
-def send_slack_message(channel, thread_ts, blocks, text="Message from script"):
-    client = WebClient(token=SLACK_API_TOKEN)
     try:
-        response = client.chat_postMessage(channel=channel, thread_ts=thread_ts, blocks=blocks, text=text)
-        return response["channel"], response["ts"]
-    except SlackApiError as e:
-        print(f"Error sending message to Slack: {e.response['error']}")
-        return None
+        sample = fetch_stats_chunk(API_TOKEN, service_id, start_time, start_time + BUCKET_SECONDS.get(by, 60), by)
+    except requests.exceptions.RequestException as e:
+        info_print(f"Error retrieving stats fields from Fastly API: {e}")
+        return False
+    update_field_schema(sample)
+    return bool(sample)
 
-def update_slack_message(channel, ts, blocks, text="Updated message from script", thread_ts=None):
-    client = WebClient(token=SLACK_API_TOKEN)
-    try:
-        if thread_ts:
-            client.chat_update(channel=channel, ts=ts, thread_ts=thread_ts, blocks=blocks, text=text)
-        else:
-            client.chat_update(channel=channel, ts=ts, blocks=blocks, text=text)
-    except SlackApiError as e:
-        print(f"Error updating message on Slack: {e.response['error']}")
+def send_slack_message(channel, thread_ts, blocks, text="Message from script"):
+    return post_message(SLACK_API_TOKEN, channel, thread_ts, blocks, text)
 
 def delete_slack_message(channel, ts):
-    client = WebClient(token=SLACK_API_TOKEN)
+    from slack_sdk.errors import SlackApiError
+    client = get_slack_client(SLACK_API_TOKEN)
     try:
         client.chat_delete(channel=channel, ts=ts)
     except SlackApiError as e:
-        print(f"Error deleting message on Slack: {e.response['error']}")
-
-def generate_dashboard_url(service_id, range_str, is_realtime=False):
-    if is_realtime:
-        return FASTLY_DASHBOARD_REALTIME_URL.format(service_id=service_id, range=range_str)
-    else:
-        return FASTLY_DASHBOARD_HISTORICAL_URL.format(service_id=service_id, range=range_str)
-
-def generate_slack_blocks(summary, interval_summary, service_name, environment, service_id, is_realtime, previous_interval_summary=None):
-    blocks = [
-        {
-            "type": "header",
-            "text": {
-                "type": "plain_text",
-                "text": ":bar_chart: Real-Time Data Summary" if is_realtime else ":bar_chart: Historical Data Summary"
-            }
-        },
-        {
-            "type": "section",
-            "fields": [
-                {
-                    "type": "mrkdwn",
-                    "text": f"*Service Name:*\n<{generate_dashboard_url(service_id, '1m', is_realtime)}|{service_name}>"
-                },
-                {
-                    "type": "mrkdwn",
-                    "text": f"*Environment:*\n{environment.title()}"
-                }
-            ]
-        },
-        {"type": "divider"}
-    ]
-
-    for field, value in summary.items():
-        if not is_realtime:
-            blocks.append({
-                "type": "section",
-                "fields": [
-                    {
-                        "type": "mrkdwn",
-                        "text": f"*{field.replace('_', ' ').title()}*"
-                    }
-                ]
-            })
-        else:
-            interval_value = interval_summary.get(field, 0)
-            previous_value = previous_interval_summary.get(field, 0) if previous_interval_summary else 0
-            change_emoji = ""
-            if interval_value > previous_value:
-                change_emoji = " :arrow_up:"
-            elif interval_value < previous_value:
-                change_emoji = " :small_red_triangle_down:"
-
-            blocks.append({
-                "type": "section",
-                "fields": [
-                    {
-                        "type": "mrkdwn",
-                        "text": f"*{field.replace('_', ' ').title()}*\n*Last Interval:* `{format_value(interval_value)}` {change_emoji}"
-                    }
-                ]
-            })
-
-    if is_realtime:
-        blocks.append({
-            "type": "section",
-            "text": {
-                "type": "mrkdwn",
-                "text": "_You can stop the stream by clicking on the 'Stop' button on this thread._"
-            }
-        })
-
-    return blocks
-
-def generate_final_slack_blocks_with_intervals(summary, interval_summary, service_name, environment, service_id):
-    blocks = [
-        {
-            "type": "header",
-            "text": {
-                "type": "plain_text",
-                "text": ":bar_chart: Final Real-Time Data Summary"
-            }
-        },
-        {
-            "type": "section",
-            "fields": [
-                {
-                    "type": "mrkdwn",
-                    "text": f"*Service Name:*\n<{generate_dashboard_url(service_id, '1m', is_realtime=True)}|{service_name}>"
-                },
-                {
-                    "type": "mrkdwn",
-                    "text": f"*Environment:*\n{environment.title()}"
-                }
-            ]
-        },
-        {"type": "divider"}
-    ]
-
-    for field, value in summary.items():
-        interval_value = interval_summary.get(field, 0)
-        blocks.append({
-            "type": "section",
-            "fields": [
-                {
-                    "type": "mrkdwn",
-                    "text": f"*{field.replace('_', ' ').title()}*\n*Last Interval:* `{format_value(interval_value)}`"
-                }
-            ]
-        })
-
-    return blocks
-
-def stream_real_time_data(api_token, service_name, environment, service_id, duration, wait_interval=DEFAULT_WAIT_INTERVAL, slack_channel=None, thread_ts=None):
-    print(f"Streaming real-time data for {duration} seconds with a wait interval of {wait_interval} seconds...")
-    end_time = datetime.utcnow() + timedelta(seconds=duration)
-    total_stats = {field: 0 for field in COMMON_FIELDS}
-    previous_stats = {field: 0 for field in COMMON_FIELDS}
-
-    slack_ts = None
-    if slack_channel:
-        blocks = generate_slack_blocks(total_stats, {}, service_name, environment, service_id, is_realtime=True)
-        channel, slack_ts = send_slack_message(slack_channel, thread_ts, blocks)
-    
-    try:
-        while datetime.utcnow() < end_time:
-            time.sleep(wait_interval)
-            stats_data = get_real_time_data(api_token, service_id, duration_seconds=wait_interval)
-            if not stats_data:
-                print("Unable to retrieve real-time data.")
-                return
-
-            interval_stats = {field: 0 for field in COMMON_FIELDS}
-            for data_point in stats_data:
-                for common_field in COMMON_FIELDS:
-                    if common_field in data_point['aggregated']:
-                        interval_stats[common_field] += data_point['aggregated'][common_field]
-
-            for field in COMMON_FIELDS:
-                total_stats[field] += interval_stats[field]
-
-            if slack_channel:
-                blocks = generate_slack_blocks(total_stats, interval_stats, service_name, environment, service_id, is_realtime=True, previous_interval_summary=previous_stats)
-                update_slack_message(channel, slack_ts, blocks, thread_ts)
-                previous_stats = interval_stats.copy()
-            else:
-                print(f"\nReal-Time Data Summary (Last {wait_interval} seconds):")
-                for field, value in interval_stats.items():
-                    print(f"{field}: {format_value(value)}")
-                print("\n---\n")
-
-        if not slack_channel:
-            print("\nTotal Real-Time Data Summary:")
-            for field, value in total_stats.items():
-                print(f"{field}: {format_value(value)}")
-            print("\n---\n")
-    finally:
-        if slack_channel and slack_ts:
-            final_blocks = generate_final_slack_blocks_with_intervals(total_stats, previous_stats, service_name, environment, service_id)
-            update_slack_message(slack_channel, slack_ts, final_blocks)
+        info_print(f"Error deleting message on Slack: {e.response['error']}")
 
 def main(environment=None, service_name=None, field_name=None, duration=None, realtime=False, stream_duration=DEFAULT_STREAM_DURATION, wait_interval=DEFAULT_WAIT_INTERVAL, slack_channel=None, thread_ts=None):
     try:
         if not environment:
-            print("No environment specified. Please provide one of the following environments:")
+            info_print("No environment specified. Please provide one of the following environments:")
             for env in VALID_ENVIRONMENTS:
-                print(f"  - {env}")
+                info_print(f"  - {env}")
             return
 
         environment = get_environment(environment)
         if not environment:
-            print(f"No matching environment found for '{environment}'. Available environments: {VALID_ENVIRONMENTS}")
+            info_print(f"No matching environment found for '{environment}'. Available environments: {VALID_ENVIRONMENTS}")
             return
 
         if not service_name:
-            print("No service name specified. Please provide a service name.")
+            info_print("No service name specified. Please provide a service name.")
             return
 
-        service_prefix = construct_service_prefix(service_name, environment)
-        debug_print(f"Constructed service prefix: {service_prefix}")
+        # A comma separated list of services streams all of them from this one process
+        service_names = [name.strip() for name in service_name.split(',') if name.strip()]
+        if realtime and len(service_names) > 1:
+            services = list_services()
+            if not services:
+                info_print("No services found.")
+                return
+            matched_services = []
+            for name in service_names:
+                best_match = resolve_service(name, environment, services)
+                if not best_match:
+                    info_print(f"No matching service found for '{name}'.")
+                    return
+                debug_print(f"Best matching service for '{name}': {best_match}")
+                matched_services.append((best_match, services[best_match]))
+            stream_multi_real_time_data(API_TOKEN, matched_services, environment, stream_duration, wait_interval, slack_channel, thread_ts, SLACK_API_TOKEN, SLACK_HEADER_FIELDS)
+            for best_match, service_id in matched_services:
+                info_print(f"View more details for {best_match} in the Fastly dashboard: {generate_dashboard_url(service_id, f'{stream_duration}s', is_realtime=True)}")
+            return
+
+        # Fields resolve from the local schema, so once it has been learned a bad field name fails before any network call
+        matching_field = None
+        field_suggestions = []
+        verify_field = False
+        if not realtime and field_name and field_name.lower() != "overview":
+            matching_field, field_suggestions, verify_field = get_matching_field(field_name)
 
         debug_print("Fetching list of services...")
         services = list_services()
         
         if not services:
-            print("No services found.")
+            info_print("No services found.")
             return
 
-        best_match = get_best_match(service_prefix, list(services.keys()))
+        best_match = resolve_service(service_name, environment, services)
         if not best_match:
-            print(f"No matching service found for '{service_prefix}'.")
+            info_print(f"No matching service found for '{construct_service_prefix(service_name, environment)}'.")
             return
 
         service_id = services[best_match]
         debug_print(f"Best matching service: {best_match}")
 
         if realtime:
-            stream_real_time_data(API_TOKEN, best_match, environment, service_id, stream_duration, wait_interval, slack_channel, thread_ts)
-            print(f"View more details in the Fastly dashboard: {generate_dashboard_url(service_id, f'{stream_duration}s', is_realtime=True)}")
+            stream_real_time_data(API_TOKEN, best_match, environment, service_id, stream_duration, wait_interval, slack_channel, thread_ts, SLACK_API_TOKEN, SLACK_HEADER_FIELDS)
+            info_print(f"View more details in the Fastly dashboard: {generate_dashboard_url(service_id, f'{stream_duration}s', is_realtime=True)}")
             return
 
         if not duration:
-            print("No duration specified. Please provide a duration in the format 'X minutes ago', 'X hours ago', etc.")
+            info_print("No duration specified. Please provide a duration in the format 'X minutes ago', 'X hours ago', etc.")
             return
 
         start_time, end_time, by, range_str = get_time_range(duration)
         if start_time is None or end_time is None:
-            print("Failed to parse the duration provided.")
+            info_print("Failed to parse the duration provided.")
             return
 
         debug_print(f"Calculated start_time: {datetime.fromtimestamp(start_time)}, end_time: {datetime.fromtimestamp(end_time)}, by: {by}")
+        if verify_field:
+            # A fuzzy match is only accepted once it has been scored against the fields the API actually reports
+            debug_print(f"'{field_name}' is not in the seed field list, learning the real fields first...")
+            if not learn_field_schema(service_id, start_time, by):
+                report_ambiguous_field(field_name, ([matching_field] if matching_field else []) + field_suggestions)
+            matching_field, field_suggestions, _ = get_matching_field(field_name)
         debug_print(f"Retrieving historical data for service '{best_match}' from {start_time} to {end_time}...")
-        stats_data = get_historical_data(API_TOKEN, service_id, start_time, end_time, by)
-        if not stats_data:
-            print(f"Unable to retrieve historical data for service '{best_match}', falling back to real-time data.")
-            stream_real_time_data(API_TOKEN, best_match, environment, service_id, stream_duration, wait_interval, slack_channel, thread_ts)
-            print(f"View more details in the Fastly dashboard: {generate_dashboard_url(service_id, f'{stream_duration}s', is_realtime=True)}")
+        if matching_field:
+            # A single stat is decoded and aggregated as it streams in, so long ranges never sit in memory
+            aggregates, bucket_count = get_historical_aggregates(API_TOKEN, service_id, start_time, end_time, by, [matching_field]) or (None, 0)
+        else:
+            # Stored and freshly fetched rows are aggregated batch by batch, never collected into one list
+            aggregator, sample = get_historical_data(API_TOKEN, service_id, start_time, end_time, by, COMMON_FIELDS) or (None, [])
+            bucket_count = aggregator.count if aggregator else 0
+        if not bucket_count:
+            info_print(f"Unable to retrieve historical data for service '{best_match}', falling back to real-time data.")
+            stream_real_time_data(API_TOKEN, best_match, environment, service_id, stream_duration, wait_interval, slack_channel, thread_ts, SLACK_API_TOKEN, SLACK_HEADER_FIELDS)
+            info_print(f"View more details in the Fastly dashboard: {generate_dashboard_url(service_id, f'{stream_duration}s', is_realtime=True)}")
             return
 
         summary = {}
         channel = None
         slack_ts = None
-        if not field_name or field_name.lower() == "overview":
+        if not matching_field:
+            # Only full rows show which fields the API currently reports
+            update_field_schema(sample)
+            aggregates = aggregator.results()
+            debug_print(f"Aggregated {bucket_count} buckets: {aggregates}")
             for common_field in COMMON_FIELDS:
-                values = [data.get(common_field, 0) for data in stats_data]
-                total_value = sum(values)
-                formatted_total_value = format_value(total_value)
-                summary[common_field] = formatted_total_value
-            blocks = generate_slack_blocks(summary, {}, best_match, environment, service_id, is_realtime=False)
+                summary[common_field] = format_value(aggregates[common_field]['sum'])
+            if ndjson_enabled():
+                emit_record("historical", service=best_match, service_id=service_id, environment=environment, start_time=start_time, end_time=end_time, by=by, buckets=bucket_count, stats=aggregates)
+            blocks = generate_slack_blocks(summary, {}, best_match, environment, service_id, is_realtime=False, header_fields=SLACK_HEADER_FIELDS)
             debug_print(f"Generated Slack blocks for historical data: {blocks}")
             if slack_channel:
                 channel, slack_ts = send_slack_message(slack_channel, thread_ts, blocks, text="Historical data overview")
                 debug_print(f"Slack message sent: channel={channel}, ts={slack_ts}")
-            else:
+            elif not ndjson_enabled():
+                from pprint import pprint
                 pprint(summary)
-            print(f"View more details in the Fastly dashboard: {generate_dashboard_url(service_id, range_str, is_realtime=False)}")
+            info_print(f"View more details in the Fastly dashboard: {generate_dashboard_url(service_id, range_str, is_realtime=False)}")
             return
 
-        matching_field, all_fields = get_matching_field(field_name, stats_data)
-        if not matching_field:
-            print(f"No matching field found for '{field_name}'")
-            return
-        
-        values = [data.get(matching_field, 0) for data in stats_data]
-        total_value = sum(values)
-        formatted_total_value = format_value(total_value)
+        debug_print(f"Aggregated {bucket_count} buckets: {aggregates}")
+        formatted_total_value = format_value(aggregates[matching_field]['sum'])
+        if ndjson_enabled():
+            emit_record("historical", service=best_match, service_id=service_id, environment=environment, start_time=start_time, end_time=end_time, by=by, buckets=bucket_count, stats=aggregates)
         summary[matching_field] = formatted_total_value
 
-        print(f"Total value for the last {duration}: {formatted_total_value} (from field: {matching_field})")
+        info_print(f"Total value for the last {duration}: {formatted_total_value} (from field: {matching_field})")
 
-        suggestions = [
-            suggestion for suggestion in process.extract(field_name, all_fields, limit=3, scorer=fuzz.WRatio) 
-            if suggestion[0] != matching_field.replace(' ', '_').replace('-', '_')
-        ]
-
-        if suggestions:
-            print("Other close fields you might want to query:")
-            for suggestion, score in suggestions:
-                print(f"  - {suggestion.replace(' ', '_')}")
+        if field_suggestions:
+            info_print("Other close fields you might want to query:")
+            for suggestion in field_suggestions[:3]:
+                info_print(f"  - {suggestion}")
         
-        print(f"View more details in the Fastly dashboard: {generate_dashboard_url(service_id, range_str, is_realtime=False)}")
+        info_print(f"View more details in the Fastly dashboard: {generate_dashboard_url(service_id, range_str, is_realtime=False)}")
 
     except Exception as e:
-        print(f"An error occurred: {e}")
+        info_print(f"An error occurred: {e}")
 
 def parse_duration(duration):
     duration = duration.lower().strip()
@@ -491,16 +397,20 @@ def get_time_range(duration):
     now = datetime.utcnow().replace(second=0, microsecond=0)
     duration_parts = parse_duration(duration)
     if not duration_parts or len(duration_parts) < 2:
-        print("Invalid duration format. Supported formats: 'X seconds ago', 'X minutes ago', 'X hours ago', 'X days ago', 'X weeks ago', 'X months ago'")
+        info_print("Invalid duration format. Supported formats: 'X seconds ago', 'X minutes ago', 'X hours ago', 'X days ago', 'X weeks ago', 'X months ago'")
         return None, None, None, None
 
     try:
         quantity = int(duration_parts[0])
     except ValueError:
-        print(f"Invalid quantity '{duration_parts[0]}' in duration. Must be an integer.")
+        info_print(f"Invalid quantity '{duration_parts[0]}' in duration. Must be an integer.")
         return None, None, None, None
 
-    unit = process.extractOne(duration_parts[1], TIME_UNITS, scorer=fuzz.ratio)[0]
+    unit = duration_parts[1]
+    if unit not in TIME_UNITS:
+        # Only misspelt units need fuzzy matching; the common spellings resolve without loading fuzzywuzzy
+        from fuzzywuzzy import process, fuzz
+        unit = process.extractOne(unit, TIME_UNITS, scorer=fuzz.ratio)[0]
     start_time = None
     end_time = now.timestamp()
     by = 'minute'
@@ -524,38 +434,43 @@ def get_time_range(duration):
         start_time = (now - timedelta(days=30 * quantity)).timestamp()
         by = 'day'
     else:
-        print("Invalid unit format. Supported units are 'second(s)', 'minute(s)', 'hour(s)', 'day(s)', 'week(s)', 'month(s)'.")
+        info_print("Invalid unit format. Supported units are 'second(s)', 'minute(s)', 'hour(s)', 'day(s)', 'week(s)', 'month(s)'.")
         return None, None, None, None
 
     debug_print(f"Calculated start_time: {datetime.fromtimestamp(start_time)}, end_time: {datetime.fromtimestamp(end_time)}, by: {by}")
     return start_time, end_time, by, range_str
 
-if __name__ == "__main__":
-    args = sys.argv[1:]
+def run_cli(args, slack_channel=SLACK_CHANNEL_ID, thread_ts=SLACK_THREAD_TS, output_format=None):
+    # Set per query by the daemon from the client's FASTLY_OUTPUT_FORMAT; otherwise this process's own setting applies
+    set_output_format(output_format)
     if len(args) == 1 and args[0] == "list_services":
+        from pprint import pprint
         services = list_services()
         pprint(services)
+    elif len(args) == 1 and args[0] == "refresh_services":
+        # Run detached by list_services when it answers from a stale catalog; returns at once if another refresh holds the lock
+        refresh_cache(CACHE_FILE, refresh_services, blocking=False)
     elif len(args) == 4 and args[3].lower() == "realtime":
         try:
             ENVIRONMENT = args[0]
             SERVICE_NAME = args[1]
             FIELD_NAME = args[2]
-            main(ENVIRONMENT, SERVICE_NAME, FIELD_NAME, realtime=True, slack_channel=SLACK_CHANNEL_ID, thread_ts=SLACK_THREAD_TS)
+            main(ENVIRONMENT, SERVICE_NAME, FIELD_NAME, realtime=True, slack_channel=slack_channel, thread_ts=thread_ts)
         except ValueError as e:
-            print(f"An error occurred while parsing arguments: {e}")
+            info_print(f"An error occurred while parsing arguments: {e}")
         except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+            info_print(f"An unexpected error occurred: {e}")
     elif len(args) == 5 and args[4].lower() == "realtime":
         try:
             ENVIRONMENT = args[0]
             SERVICE_NAME = args[1]
             FIELD_NAME = args[2]
             STREAM_DURATION = int(args[3])
-            main(ENVIRONMENT, SERVICE_NAME, FIELD_NAME, realtime=True, stream_duration=STREAM_DURATION, slack_channel=SLACK_CHANNEL_ID, thread_ts=SLACK_THREAD_TS)
+            main(ENVIRONMENT, SERVICE_NAME, FIELD_NAME, realtime=True, stream_duration=STREAM_DURATION, slack_channel=slack_channel, thread_ts=thread_ts)
         except ValueError as e:
-            print(f"An error occurred while parsing arguments: {e}")
+            info_print(f"An error occurred while parsing arguments: {e}")
         except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+            info_print(f"An unexpected error occurred: {e}")
     elif len(args) == 6 and args[4].lower() == "realtime":
         try:
             ENVIRONMENT = args[0]
@@ -563,22 +478,40 @@ if __name__ == "__main__":
             FIELD_NAME = args[2]
             STREAM_DURATION = int(args[3])
             WAIT_INTERVAL = int(args[5])
-            main(ENVIRONMENT, SERVICE_NAME, FIELD_NAME, realtime=True, stream_duration=STREAM_DURATION, wait_interval=WAIT_INTERVAL, slack_channel=SLACK_CHANNEL_ID, thread_ts=SLACK_THREAD_TS)
+            if WAIT_INTERVAL <= 0:
+                # Polls run on a fixed schedule of one per interval, so there is no continuous mode any more
+                info_print(f"Invalid wait_interval '{args[5]}'. Must be a positive number of seconds.")
+                return 1
+            main(ENVIRONMENT, SERVICE_NAME, FIELD_NAME, realtime=True, stream_duration=STREAM_DURATION, wait_interval=WAIT_INTERVAL, slack_channel=slack_channel, thread_ts=thread_ts)
         except ValueError as e:
-            print(f"An error occurred while parsing arguments: {e}")
+            info_print(f"An error occurred while parsing arguments: {e}")
         except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+            info_print(f"An unexpected error occurred: {e}")
     elif len(args) == 4:
         try:
             ENVIRONMENT = args[0]
             SERVICE_NAME = args[1]
             FIELD_NAME = args[2]
             DURATION = args[3]
-            main(ENVIRONMENT, SERVICE_NAME, FIELD_NAME, duration=DURATION, slack_channel=SLACK_CHANNEL_ID, thread_ts=SLACK_THREAD_TS)
+            main(ENVIRONMENT, SERVICE_NAME, FIELD_NAME, duration=DURATION, slack_channel=slack_channel, thread_ts=thread_ts)
         except ValueError as e:
-            print(f"An error occurred while parsing arguments: {e}")
+            info_print(f"An error occurred while parsing arguments: {e}")
         except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+            info_print(f"An unexpected error occurred: {e}")
+    else:
+        info_print(f"Usage: python {sys.argv[0]} <environment> <service_name[,service_name...]> <field_name|overview> <duration> [realtime <timeout> [wait_interval]]")
+        info_print(f"       python {sys.argv[0]} list_services | daemon")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if timing_enabled():
+        # Started up front so a daemon exposes /metrics before its first query
+        start_timing()
+    if len(args) == 1 and args[0] == "daemon":
+        from fastly_common.daemon import serve, daemon_socket_path
+        BACKGROUND_REFRESH_COMMAND = None
+        sys.exit(serve(run_cli, daemon_socket_path(sys.argv[0])))
     else:
-        print(f"Usage: python {sys.argv[0]} <environment> <service_name> <field_name|overview> <duration> [realtime <timeout> [wait_interval]]")
-        sys.exit(1)
+        sys.exit(run_cli(args))
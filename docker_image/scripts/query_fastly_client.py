@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+import os
+import sys
+from fastly_common.daemon import run_client, daemon_socket_path
+
+FALLBACK_COMMAND = os.getenv("FASTLY_CLIENT_FALLBACK", "query-fastly")
+
+if __name__ == "__main__":
+    # Queries go to the daemon of the command this client would otherwise run
+    exit_code = run_client(sys.argv[1:], daemon_socket_path(FALLBACK_COMMAND))
+    if exit_code is None:
+        # No daemon listening: run the query in a fresh process instead
+        os.execvp(FALLBACK_COMMAND, [FALLBACK_COMMAND] + sys.argv[1:])
+    sys.exit(exit_code)
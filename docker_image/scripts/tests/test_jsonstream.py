@@ -0,0 +1,78 @@
+import os
+import sys
+import json
+import random
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastly_common.jsonstream import iter_json_array
+
+SEEDS = range(200)
+
+def split_randomly(body, rng):
+    # Cuts land anywhere, including inside numbers, escapes and multi-byte characters
+    chunks = []
+    pos = 0
+    while pos < len(body):
+        size = rng.choice((1, 1, 2, 3, rng.randint(1, 64)))
+        chunks.append(body[pos:pos + size])
+        pos += size
+    return chunks
+
+def random_scalar(rng):
+    return rng.choice([
+        lambda: rng.randint(-10 ** 12, 10 ** 12),
+        lambda: rng.uniform(-1e6, 1e6),
+        lambda: rng.choice([0.5, -0.25, 1e-7, 3.5e21, -2e-300, 0, -0]),
+        lambda: rng.choice([True, False, None]),
+        lambda: "".join(rng.choice("ab \"\\/\n\té€😀") for _ in range(rng.randint(0, 12))),
+    ])()
+
+def random_value(rng, depth=0):
+    kind = rng.random()
+    if depth < 3 and kind < 0.2:
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    if depth < 3 and kind < 0.4:
+        return {f"k{i}": random_value(rng, depth + 1) for i in range(rng.randint(0, 4))}
+    return random_scalar(rng)
+
+def random_document(rng):
+    data = [random_value(rng) for _ in range(rng.randint(0, 30))]
+    # The array is not always the first or the last member of the document
+    members = [("meta", random_value(rng)), ("data", data), ("status", "success")]
+    rng.shuffle(members)
+    return dict(members), data
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_random_chunking_matches_json_loads(seed):
+    rng = random.Random(seed)
+    document, data = random_document(rng)
+    body = json.dumps(document, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 1])).encode()
+    assert list(iter_json_array(split_randomly(body, rng), "data")) == data
+
+@pytest.mark.parametrize("chunks, expected", [
+    ([b'{"data":[0.', b'5]}'], [0.5]),
+    ([b'{"data":[1', b'e', b'-', b'3,-', b'2]}'], [0.001, -2]),
+    ([b'{"data":[12', b'34', b']}'], [1234]),
+    ([b'{"data":[-', b'1.5E+', b'2]}'], [-150.0]),
+    ([b'{"data":[7]', b'}'], [7]),
+    ([b'{"data":[tr', b'ue,nu', b'll]}'], [True, None]),
+])
+def test_scalars_split_across_chunks(chunks, expected):
+    assert list(iter_json_array(chunks, "data")) == expected
+
+@pytest.mark.parametrize("body", [b'{}', b'{"data":[]}', b'{"meta":{"data":[1]}}', b'{"data":null}'])
+def test_missing_or_empty_array_yields_nothing(body):
+    assert list(iter_json_array([body], "data")) == []
+
+def test_rest_of_document_is_not_read():
+    def chunks():
+        yield b'{"data":[{"start_time":1}],"meta":'
+        raise AssertionError("read past the end of the array")
+    assert list(iter_json_array(chunks(), "data")) == [{"start_time": 1}]
+
+@pytest.mark.parametrize("body", [b'[1,2]', b'{"data":[1 2]}', b'{"data":[1,', b'{"data":[1,23'])
+def test_malformed_documents_raise(body):
+    with pytest.raises(ValueError):
+        list(iter_json_array([body], "data"))
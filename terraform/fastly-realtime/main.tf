@@ -32,6 +32,7 @@ If a user wants to query fastly, you need to make sure to ask the user for the f
 
 **After you got the minimal required information, quickly execute the `query-fastly` command with the provided parameters.**
 - Example for Real-time data query: `query-fastly-realtime "production" "yoga" "overview" realtime`
+- Example for several services at once (comma separated, streamed from a single process): `query-fastly-realtime "production" "yoga,pulse,cplay" "overview" realtime`
 
 --> Be fast and efficient, don't talk too much, and provide the data as soon as possible.
 EOT